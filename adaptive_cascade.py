@@ -0,0 +1,122 @@
+import logging
+import time
+from collections import Counter, defaultdict
+from llama_index.core.schema import QueryBundle
+
+logger = logging.getLogger(__name__)
+
+# Cheapest first: plain vector search, then reranked sentence windows, then graph traversal
+CASCADE_STAGES = ('base', 'sentence_window', 'knowledge_graph')
+
+
+class AdaptiveRetrieverCascade:
+    def __init__(
+            self,
+            rag_engine,
+            min_similarity=0.5,
+            min_margin=0.02,
+            min_rerank_score=0.3,
+            signal_top_k=6,
+            base_top_k=2
+    ):
+        """
+        Answers with the cheap base retriever and escalates only when its results look weak.
+
+        The base stage is trusted when the best similarity score is at least `min_similarity`
+        and stands out from the rest of the top `signal_top_k` results by `min_margin`
+        (a flat score distribution means no chunk clearly matches). Otherwise the question
+        goes to the reranked sentence-window retriever, which is trusted when its best
+        cross-encoder score reaches `min_rerank_score`, and finally to the knowledge graph.
+
+        Parameters:
+        rag_engine (RAGEngine): Engine providing the indexes and query engines.
+        min_similarity (float): Minimum top cosine similarity to accept the base stage.
+        min_margin (float): Minimum gap between the top score and the mean of the other scores.
+        min_rerank_score (float): Minimum top rerank score to accept the sentence-window stage.
+        signal_top_k (int): Number of base results used to compute the confidence signals.
+        base_top_k (int): Number of base results passed to synthesis, as in the base engine.
+        """
+        self.rag_engine = rag_engine
+        self.min_similarity = min_similarity
+        self.min_margin = min_margin
+        self.min_rerank_score = min_rerank_score
+        self.signal_top_k = signal_top_k
+        self.base_top_k = base_top_k
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.stage_counts = Counter()
+        self.stage_latencies = defaultdict(list)
+
+    def base_confidence(self, nodes):
+        """Return (top score, margin) for a list of scored base nodes."""
+        scores = sorted((n.score or 0.0 for n in nodes), reverse=True)
+        if not scores:
+            return 0.0, 0.0
+        rest = scores[1:]
+        margin = scores[0] - (sum(rest) / len(rest)) if rest else scores[0]
+        return scores[0], margin
+
+    def query(self, question, bundle=None, papers=None):
+        """
+        Answer `question`, escalating through the cascade as needed.
+
+        Parameters:
+        question (str): The question to answer.
+        bundle (IndexBundle): Indexes to use; defaults to the engine's current bundle.
+        papers (list): Optional papers to restrict retrieval to. The knowledge graph cannot
+            honour this filter, so the cascade then stops at the sentence-window stage.
+
+        Returns:
+        tuple: The query response and the name of the stage that produced it.
+        """
+        start = time.perf_counter()
+        bundle = bundle or self.rag_engine.current_bundle
+        query_bundle = QueryBundle(question)
+
+        base_nodes = self.rag_engine.get_vector_retriever(
+            'base', bundle, papers, similarity_top_k=self.signal_top_k).retrieve(query_bundle)
+        top_score, margin = self.base_confidence(base_nodes)
+        if top_score >= self.min_similarity and margin >= self.min_margin:
+            packer = self.rag_engine.context_packers['base']
+            nodes = packer.postprocess_nodes(base_nodes[:self.base_top_k], query_bundle=query_bundle)
+            response = self.rag_engine.get_query_engine('base', bundle, papers).synthesize(query_bundle, nodes)
+            return self._record('base', start, response)
+
+        logger.info(f"Escalating to sentence_window (score={top_score:.3f}, margin={margin:.3f})")
+        sentence_engine = self.rag_engine.get_query_engine('sentence_window', bundle, papers)
+        sentence_nodes = sentence_engine.retrieve(query_bundle)
+        rerank_score = max((n.score or 0.0 for n in sentence_nodes), default=0.0)
+        if rerank_score >= self.min_rerank_score or papers:
+            response = sentence_engine.synthesize(query_bundle, sentence_nodes)
+            return self._record('sentence_window', start, response)
+
+        logger.info(f"Escalating to knowledge_graph (rerank score={rerank_score:.3f})")
+        response = self.rag_engine.get_query_engine('knowledge_graph', bundle).query(query_bundle)
+        return self._record('knowledge_graph', start, response)
+
+    def _record(self, stage, start, response):
+        self.stage_counts[stage] += 1
+        self.stage_latencies[stage].append(time.perf_counter() - start)
+        return response, stage
+
+    def report(self):
+        """
+        Summarise how often each stage answered and how long it took.
+
+        Returns:
+        dict: Total queries, escalation rate and per-stage counts and mean latency in seconds.
+        """
+        total = sum(self.stage_counts.values())
+        return {
+            'queries': total,
+            'escalation_rate': (total - self.stage_counts['base']) / total if total else 0.0,
+            'stages': {
+                stage: {
+                    'count': self.stage_counts[stage],
+                    'mean_latency': (sum(self.stage_latencies[stage]) / len(self.stage_latencies[stage])
+                                     if self.stage_latencies[stage] else None),
+                }
+                for stage in CASCADE_STAGES
+            },
+        }
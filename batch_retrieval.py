@@ -0,0 +1,83 @@
+import numpy as np
+from typing import Dict, List
+from llama_index.core.base.base_retriever import BaseRetriever
+from llama_index.core.schema import MetadataMode, NodeWithScore, QueryBundle
+
+
+class PrecomputedRetriever(BaseRetriever):
+    """
+    Retriever that returns results computed ahead of time by a batched search.
+
+    Lets retrievers that wrap another retriever (AutoMergingRetriever) run on top of
+    the batched vector search instead of querying the vector store again.
+    """
+
+    def __init__(self, results: Dict[str, List[NodeWithScore]]):
+        super().__init__()
+        self._results = results
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        return list(self._results.get(query_bundle.query_str, []))
+
+
+def batch_vector_search(index, embeddings, query_embeddings, top_k, allowed_rows=None):
+    """
+    Top-k search for many queries against one vector index as a single matrix product.
+
+    Parameters:
+    index (VectorStoreIndex): Index whose docstore holds the nodes.
+    embeddings (EmbeddingMatrix): Shared embeddings of the same index.
+    query_embeddings (np.ndarray): One query embedding per row.
+    top_k (int): Number of nodes per query.
+    allowed_rows (list): Optional per-query array of matrix rows to search (e.g. the rows of
+        the selected paper partitions); None entries search everything.
+
+    Returns:
+    list: One list of NodeWithScore per query, best first.
+    """
+    scores = embeddings.cosine_scores(np.asarray(query_embeddings, dtype=np.float32))
+    for query_index, rows in enumerate(allowed_rows or []):
+        if rows is not None:
+            mask = np.full(scores.shape[1], -np.inf, dtype=scores.dtype)
+            mask[rows] = 0.0
+            scores[query_index] += mask
+    results = embeddings.top_k_from_scores(scores, top_k)
+    node_lists = []
+    for node_ids, node_scores in results:
+        nodes = index.docstore.get_nodes(node_ids)
+        node_lists.append([NodeWithScore(node=node, score=score) for node, score in zip(nodes, node_scores)])
+    return node_lists
+
+
+def batch_rerank(reranker, query_strs, node_lists, batch_size=32):
+    """
+    Rerank the candidates of many queries with one cross-encoder pass.
+
+    SentenceTransformerRerank scores one query at a time; here every (query, node) pair of
+    the batch goes through the cross-encoder together, which keeps its batches full.
+
+    Parameters:
+    reranker (SentenceTransformerRerank): Loaded reranker; its model and top_n are reused.
+    query_strs (list): Query of each node list.
+    node_lists (list): Candidate nodes per query.
+    batch_size (int): Cross-encoder batch size.
+
+    Returns:
+    list: The top `reranker.top_n` nodes per query, rescored and best first.
+    """
+    pairs = [
+        (query_str, node.node.get_content(metadata_mode=MetadataMode.EMBED))
+        for query_str, nodes in zip(query_strs, node_lists)
+        for node in nodes
+    ]
+    # The reranker keeps its CrossEncoder private; reuse it rather than loading a second copy
+    scores = reranker._model.predict(pairs, batch_size=batch_size) if pairs else []
+
+    reranked = []
+    offset = 0
+    for nodes in node_lists:
+        for node, score in zip(nodes, scores[offset:offset + len(nodes)]):
+            node.score = float(score)
+        offset += len(nodes)
+        reranked.append(sorted(nodes, key=lambda n: n.score, reverse=True)[:reranker.top_n])
+    return reranked
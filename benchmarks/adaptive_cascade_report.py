@@ -0,0 +1,79 @@
+"""
+Compares the 'auto' retriever cascade against fixed retrievers on the benchmark questions.
+
+For every mode it records mean and p95 latency and a cheap quality proxy: the cosine
+similarity between the embedded answer and the embedded ground truth. For 'auto' it also
+reports how often the cascade escalated past the base retriever.
+
+Usage (from the project root):
+    python -m benchmarks.adaptive_cascade_report --limit 20
+"""
+import argparse
+import asyncio
+import json
+import time
+import numpy as np
+import pandas as pd
+from rag_engine import RAGEngine
+
+MODES = ('base', 'sentence_window', 'knowledge_graph', 'auto')
+
+
+def load_benchmark(path="eval_questions/benchmark.json"):
+    with open(path, 'r') as file:
+        benchmark_data = json.load(file)
+    return benchmark_data['questions'], benchmark_data['ground_truths']
+
+
+def answer_similarity(embed_model, answers, ground_truths):
+    """Cosine similarity between each answer and its ground truth."""
+    answer_vectors = np.array(embed_model.get_text_embedding_batch(answers))
+    truth_vectors = np.array(embed_model.get_text_embedding_batch(ground_truths))
+    answer_vectors /= np.linalg.norm(answer_vectors, axis=1, keepdims=True)
+    truth_vectors /= np.linalg.norm(truth_vectors, axis=1, keepdims=True)
+    return (answer_vectors * truth_vectors).sum(axis=1)
+
+
+def cascade_report(rag_engine, questions, ground_truths, modes=MODES):
+    """
+    Runs the benchmark once per mode.
+
+    Parameters:
+    rag_engine (RAGEngine): Engine to query.
+    questions (list): Benchmark questions.
+    ground_truths (list): Reference answers, aligned with `questions`.
+    modes (tuple): Retriever types to compare, 'auto' included.
+
+    Returns:
+    tuple: DataFrame with one row per mode, and the cascade report for the 'auto' run.
+    """
+    rows = []
+    rag_engine.cascade.reset_stats()
+    for mode in modes:
+        answers, latencies = [], []
+        for question in questions:
+            start = time.perf_counter()
+            answers.append(asyncio.run(rag_engine.ask_question(question, mode)))
+            latencies.append(time.perf_counter() - start)
+
+        similarity = answer_similarity(rag_engine.embed_model, answers, ground_truths)
+        rows.append({
+            'Mode': mode,
+            'MeanLatency': float(np.mean(latencies)),
+            'P95Latency': float(np.percentile(latencies, 95)),
+            'AnswerSimilarity': float(similarity.mean()),
+        })
+    return pd.DataFrame(rows), rag_engine.cascade.report()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--limit', type=int, default=None, help='Only use the first N benchmark questions.')
+    args = parser.parse_args()
+
+    questions, ground_truths = load_benchmark()
+    results, cascade_stats = cascade_report(RAGEngine(), questions[:args.limit], ground_truths[:args.limit])
+    print(results.to_string(index=False))
+    print(f"Escalation rate: {cascade_stats['escalation_rate']:.1%}")
+    for stage, stage_stats in cascade_stats['stages'].items():
+        print(f"  {stage}: {stage_stats['count']} answers, mean latency {stage_stats['mean_latency']}")
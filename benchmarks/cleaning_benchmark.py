@@ -0,0 +1,111 @@
+"""
+Measures document cleaning throughput over the papers in data/.
+
+Page texts are extracted once up front (extraction throughput is printed for scale), so
+only cleaning is timed:
+- legacy: the previous per-marker str.find scan over each whole document,
+- references: ReferenceSectionStage alone, page by page,
+- pipeline: the full default pipeline (NUL stripping, headers/footers, hyphenation,
+  references).
+
+It also reports, per paper, whether the references stage cuts the text where the legacy
+scan did.
+
+Usage (from the project root):
+    python -m benchmarks.cleaning_benchmark --repeat 20
+"""
+import argparse
+import time
+from pathlib import Path
+import fitz  # PyMuPDF
+import pandas as pd
+from process_documents import (
+    CleaningPipeline,
+    ReferenceSectionStage,
+    default_cleaning_pipeline,
+    REFERENCE_MARKERS,
+    PRESERVATION_MARKERS
+)
+
+
+def legacy_remove_references(text):
+    """The per-marker scan remove_references_from_documents used before the pipeline."""
+    ref_start_idx = None
+    for marker in REFERENCE_MARKERS:
+        ref_start_idx = text.find(marker)
+        if ref_start_idx != -1:
+            break
+    if ref_start_idx == -1:
+        return text
+
+    remaining_text = text[ref_start_idx:]
+    preserve_start_idx = None
+    for preserve_marker in PRESERVATION_MARKERS:
+        preserve_start_idx = remaining_text.find(preserve_marker)
+        if preserve_start_idx != -1:
+            preserve_start_idx += ref_start_idx
+            break
+    if preserve_start_idx != -1:
+        return text[:ref_start_idx] + "\n" + text[preserve_start_idx:]
+    return text[:ref_start_idx].strip()
+
+
+def extract_pages(input_dir):
+    papers = {}
+    for path in sorted(Path(input_dir).rglob("*.pdf")):
+        with fitz.open(path) as doc:
+            papers[path.name] = [doc.load_page(page_num).get_text() for page_num in range(doc.page_count)]
+    return papers
+
+
+def throughput(name, clean_document, papers, repeat):
+    total_chars = sum(len(page) for pages in papers.values() for page in pages)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for pages in papers.values():
+            clean_document(pages)
+    elapsed = time.perf_counter() - start
+    return {
+        'Cleaner': name,
+        'MBPerSecond': total_chars * repeat / elapsed / 1e6,
+        'MsPerPaper': 1000 * elapsed / (repeat * len(papers)),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--input-dir', default="data")
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    papers = extract_pages(args.input_dir)
+    extraction_seconds = time.perf_counter() - start
+    total_chars = sum(len(page) for pages in papers.values() for page in pages)
+    print(f"Extracted {len(papers)} papers ({total_chars / 1e6:.2f} MB of text) "
+          f"at {total_chars / extraction_seconds / 1e6:.2f} MB/s")
+    references_only = CleaningPipeline([ReferenceSectionStage()])
+    pipeline = default_cleaning_pipeline()
+
+    cleaners = {
+        'legacy': lambda pages: legacy_remove_references("".join(pages)),
+        'references': lambda pages: "".join(references_only.clean_pages(pages)),
+        'pipeline': lambda pages: "".join(pipeline.clean_pages(pages)),
+    }
+    print(pd.DataFrame([throughput(name, cleaner, papers, args.repeat) for name, cleaner in cleaners.items()]))
+
+    rows = []
+    for paper, pages in papers.items():
+        legacy = cleaners['legacy'](pages)
+        references = cleaners['references'](pages)
+        cleaned = cleaners['pipeline'](pages)
+        rows.append({
+            'Paper': paper,
+            'Pages': len(pages),
+            'RawChars': sum(len(page) for page in pages),
+            'LegacyChars': len(legacy),
+            'ReferencesChars': len(references),
+            'SameCut': legacy.strip() == references.strip(),
+            'PipelineChars': len(cleaned),
+        })
+    print(pd.DataFrame(rows).to_string(index=False))
@@ -0,0 +1,65 @@
+"""
+Reports how many prompt tokens context packing saves per retriever on the benchmark questions.
+
+Only retrieval and postprocessing run here, no answers are synthesized, so the report
+costs one embedding call per question and retriever.
+
+Usage (from the project root):
+    python -m benchmarks.context_packing_report --token-budget 2048
+"""
+import argparse
+import json
+import pandas as pd
+from llama_index.core.schema import QueryBundle
+from rag_engine import RAGEngine, RETRIEVER_TYPES
+
+
+def load_benchmark_questions(path="eval_questions/benchmark.json"):
+    with open(path, 'r') as file:
+        return json.load(file)['questions']
+
+
+def context_packing_report(rag_engine, questions, retriever_types=RETRIEVER_TYPES):
+    """
+    Runs every question through each retriever and collects the packer statistics.
+
+    Parameters:
+    rag_engine (RAGEngine): Engine whose context packers are measured.
+    questions (list): Questions to retrieve context for.
+    retriever_types (tuple): Retrievers to include in the report.
+
+    Returns:
+    DataFrame: One row per retriever with tokens before and after packing.
+    """
+    rows = []
+    for retriever_type in retriever_types:
+        packer = rag_engine.context_packers[retriever_type]
+        packer.reset_stats()
+        query_engine = rag_engine.get_query_engine(retriever_type)
+        for question in questions:
+            query_engine.retrieve(QueryBundle(question))
+
+        stats = packer.stats
+        saved = stats['tokens_in'] - stats['tokens_out']
+        rows.append({
+            'Retriever': retriever_type,
+            'Questions': stats['queries'],
+            'NodesIn': stats['nodes_in'],
+            'NodesOut': stats['nodes_out'],
+            'TokensIn': stats['tokens_in'],
+            'TokensOut': stats['tokens_out'],
+            'TokensSaved': saved,
+            'SavedPct': round(100 * saved / stats['tokens_in'], 1) if stats['tokens_in'] else 0.0,
+        })
+    return pd.DataFrame(rows)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--token-budget', type=int, default=2048)
+    parser.add_argument('--limit', type=int, default=None, help='Only use the first N benchmark questions.')
+    args = parser.parse_args()
+
+    questions = load_benchmark_questions()[:args.limit]
+    report = context_packing_report(RAGEngine(context_token_budget=args.token_budget), questions)
+    print(report.to_string(index=False))
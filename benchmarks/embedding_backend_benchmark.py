@@ -0,0 +1,110 @@
+"""
+Compares two embedding backends on latency, throughput and retrieval quality.
+
+The reference version (default: CURRENT, normally OpenAI embeddings) and a candidate
+version produced by reembed_indexes.py share node ids, so their retrieval can be compared
+directly on the benchmark questions:
+- query latency: one question embedded at a time, p50 and p95,
+- throughput: node texts embedded per second in batches,
+- overlap@k: share of the reference top-k base-index nodes the candidate also retrieves,
+- ground-truth support: best cosine similarity, under the reference model, between the
+  retrieved chunks and the ground-truth answer.
+
+Usage (from the project root):
+    EMBED_QUANTIZE=int8 python -m benchmarks.embedding_backend_benchmark --candidate-version <version>
+"""
+import argparse
+import json
+import time
+import numpy as np
+import pandas as pd
+from llama_index.core.schema import MetadataMode
+from embeddings import get_embed_model, embed_queries
+from index_registry import IndexRegistry
+
+
+def load_benchmark(path="eval_questions/benchmark.json"):
+    with open(path, 'r') as file:
+        benchmark_data = json.load(file)
+    return benchmark_data['questions'], benchmark_data['ground_truths']
+
+
+def embed_model_for_version(registry, version):
+    manifest = registry.read_embedding_manifest(version) or {'backend': 'openai', 'model_name': None}
+    return get_embed_model(backend=manifest['backend'], model_name=manifest['model_name'])
+
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=-1, keepdims=True)
+
+
+def measure_backend(name, embed_model, bundle, questions, sample_texts, top_k):
+    latencies = []
+    for question in questions:
+        start = time.perf_counter()
+        embed_model.get_query_embedding(question)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    embed_model.get_text_embedding_batch(sample_texts)
+    throughput = len(sample_texts) / (time.perf_counter() - start)
+
+    query_embeddings = embed_queries(embed_model, questions)
+    retrieved = bundle.embeddings['base'].top_k(np.asarray(query_embeddings), top_k)
+    stats = {
+        'Backend': name,
+        'QueryP50ms': 1000 * float(np.percentile(latencies, 50)),
+        'QueryP95ms': 1000 * float(np.percentile(latencies, 95)),
+        'TextsPerSecond': throughput,
+    }
+    return stats, [node_ids for node_ids, _ in retrieved]
+
+
+def ground_truth_support(reference_model, bundle, retrieved_ids, ground_truths):
+    """Best reference-model cosine between each question's retrieved chunks and its ground truth."""
+    truths = normalize(reference_model.get_text_embedding_batch(ground_truths))
+    support = []
+    for node_ids, truth in zip(retrieved_ids, truths):
+        texts = [node.get_content(metadata_mode=MetadataMode.EMBED)
+                 for node in bundle.base_index.docstore.get_nodes(node_ids)]
+        support.append(float((normalize(reference_model.get_text_embedding_batch(texts)) @ truth).max()))
+    return float(np.mean(support))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--root', default="storage")
+    parser.add_argument('--reference-version', default=None, help="Defaults to CURRENT.")
+    parser.add_argument('--candidate-version', required=True)
+    parser.add_argument('--top-k', type=int, default=6)
+    parser.add_argument('--throughput-sample', type=int, default=512, help="Node texts embedded for throughput.")
+    parser.add_argument('--limit', type=int, default=None, help='Only use the first N benchmark questions.')
+    args = parser.parse_args()
+
+    registry = IndexRegistry(args.root)
+    questions, ground_truths = load_benchmark()
+    questions, ground_truths = questions[:args.limit], ground_truths[:args.limit]
+
+    reference_version = args.reference_version or registry.current_version()
+    reference_bundle = registry.load_bundle(reference_version)
+    candidate_bundle = registry.load_bundle(args.candidate_version)
+    reference_model = embed_model_for_version(registry, reference_version)
+    candidate_model = embed_model_for_version(registry, args.candidate_version)
+
+    sample_ids = reference_bundle.embeddings['base'].node_ids[:args.throughput_sample]
+    sample_texts = [node.get_content(metadata_mode=MetadataMode.EMBED)
+                    for node in reference_bundle.base_index.docstore.get_nodes(sample_ids)]
+
+    rows = []
+    retrieved = {}
+    for name, model, bundle in (('reference', reference_model, reference_bundle),
+                                ('candidate', candidate_model, candidate_bundle)):
+        stats, retrieved[name] = measure_backend(name, model, bundle, questions, sample_texts, args.top_k)
+        stats['GroundTruthSupport'] = ground_truth_support(reference_model, bundle, retrieved[name], ground_truths)
+        rows.append(stats)
+
+    overlap = np.mean([len(set(ref) & set(cand)) / len(ref)
+                       for ref, cand in zip(retrieved['reference'], retrieved['candidate']) if ref])
+    print(pd.DataFrame(rows).round(3).to_string(index=False))
+    print(f"Overlap@{args.top_k} of candidate with reference retrieval: {overlap:.1%}")
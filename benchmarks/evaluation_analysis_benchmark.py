@@ -0,0 +1,104 @@
+"""
+Benchmark of the evaluation results store (results_store.py) and the vectorized analysis
+(evaluation.statistical_analysis.analyze_metrics).
+
+Writes synthetic Tonic Validate runs into a temporary ResultsStore, then times:
+- appending the runs (one Parquet part file per run and table),
+- reading the question table back, before and after compaction,
+- the per-run aggregation and analyze_metrics over every metric with bootstrap intervals,
+- the legacy path on the same runs: an Excel-style OverallScores column of dict strings,
+  parsed with ast.literal_eval row by row and tested one metric and one experiment at a time.
+
+Usage (from the project root):
+    python -m benchmarks.evaluation_analysis_benchmark --runs 2000 --questions 10
+"""
+import argparse
+import ast
+import tempfile
+import time
+from types import SimpleNamespace
+import numpy as np
+import pandas as pd
+from scipy.stats import shapiro, levene, f_oneway
+from evaluation.statistical_analysis import analyze_metrics
+from results_store import ResultsStore, QUESTIONS_TABLE, RUNS_TABLE
+
+METRICS = ['retrieval_precision', 'answer_similarity', 'answer_consistency', 'latency']
+EXPERIMENTS = ['Naive RAG', 'Sentence window retrieval', 'Sentence window retrieval + Sentence rerank',
+               'Auto-merging retrieval', 'Knowledge graph based retrieval']
+
+
+def synthetic_run(rng, experiment_index, questions):
+    """An object shaped like tonic_validate's Run, with scores shifted per experiment."""
+    run_data = []
+    for index in range(questions):
+        scores = {metric: float(np.clip(rng.normal(0.6 + 0.03 * experiment_index, 0.2), 0, 1)) for metric in METRICS}
+        scores['answer_similarity'] *= 5
+        run_data.append(SimpleNamespace(scores=scores, reference_question=f"question {index}",
+                                        reference_answer="reference", llm_answer="answer",
+                                        llm_context=["context"] * 3))
+    overall = {metric: float(np.mean([data.scores[metric] for data in run_data])) for metric in METRICS}
+    return SimpleNamespace(id=None, run_data=run_data, overall_scores=overall, llm_evaluator="gpt-4o")
+
+
+def legacy_analysis(df):
+    """The pre-store path: reparse every row, then one Python loop per metric and experiment."""
+    df['OverallScores'] = df['OverallScores'].apply(ast.literal_eval)
+    for metric in METRICS:
+        df[metric] = df['OverallScores'].apply(lambda x: x[metric])
+        groups = [df[df['Experiment'] == exp][metric] for exp in df['Experiment'].unique()]
+        for scores in groups:
+            shapiro(scores)
+        levene(*groups)
+        f_oneway(*groups)
+
+
+def timed(label, call, rows):
+    start = time.perf_counter()
+    result = call()
+    elapsed = time.perf_counter() - start
+    rows.append({'Step': label, 'Seconds': elapsed})
+    print(f"{label:<45} {elapsed:8.3f} s")
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=2000, help="Runs in total, spread over the experiments.")
+    parser.add_argument('--questions', type=int, default=10, help="Questions per run.")
+    parser.add_argument('--bootstrap', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    runs = [(EXPERIMENTS[i % len(EXPERIMENTS)], synthetic_run(rng, i % len(EXPERIMENTS), args.questions))
+            for i in range(args.runs)]
+    rows = []
+
+    with tempfile.TemporaryDirectory() as root:
+        store = ResultsStore(root)
+
+        def append_all():
+            for number, (experiment, run) in enumerate(runs):
+                latencies = {data.reference_question: float(rng.gamma(2.0, 0.5)) for data in run.run_data}
+                store.append_run(experiment, run, run_number=number // len(EXPERIMENTS) + 1, latencies=latencies)
+
+        timed(f"append {args.runs} runs", append_all, rows)
+        timed(f"read questions ({len(store.part_files(QUESTIONS_TABLE))} parts)", store.questions, rows)
+        timed("compact questions and runs",
+              lambda: (store.compact(QUESTIONS_TABLE), store.compact(RUNS_TABLE)), rows)
+        timed("read questions (compacted)", store.questions, rows)
+        run_scores = timed("per-run metric means", store.run_scores, rows)
+        question_rows = store.questions()
+        timed(f"analyze_metrics, runs ({len(run_scores)} rows)",
+              lambda: analyze_metrics(run_scores, n_boot=args.bootstrap), rows)
+        analysis = timed(f"analyze_metrics, questions ({len(question_rows)} rows)",
+                         lambda: analyze_metrics(question_rows, n_boot=args.bootstrap), rows)
+
+    legacy = pd.DataFrame({'Run': [number for number in range(len(runs))],
+                           'Experiment': [experiment for experiment, _ in runs],
+                           'OverallScores': [str(run.overall_scores) for _, run in runs]})
+    timed(f"legacy analysis, runs ({len(legacy)} rows, no intervals)", lambda: legacy_analysis(legacy), rows)
+
+    print()
+    print(analysis['tests'].round(4).to_string(index=False))
@@ -0,0 +1,70 @@
+"""
+Compares full-index vector search with routed per-paper scatter-gather search.
+
+For each benchmark question it reports the share of nodes scanned after routing (and of
+questions the router sends to a full scan), the retrieval latency of both paths and how
+many of the full-scan top-k nodes the routed search still returns. Both paths are timed
+the same way: a retriever call with the query embedding precomputed, including the
+docstore lookup of the returned nodes.
+
+Usage (from the project root):
+    python -m benchmarks.partitioned_retrieval_benchmark --retriever-type base --top-k 6
+"""
+import argparse
+import json
+import time
+import numpy as np
+from llama_index.core.schema import QueryBundle
+from embeddings import get_embed_model, embed_queries
+from index_registry import IndexRegistry
+from partitioned_retrieval import PaperPartitions, PartitionedRetriever
+
+
+def timed_retrieve(retriever, question, query_embedding):
+    start = time.perf_counter()
+    nodes = retriever.retrieve(QueryBundle(question, embedding=list(query_embedding)))
+    return nodes, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--root', default="storage")
+    parser.add_argument('--retriever-type', default='base', choices=['base', 'sentence_window', 'auto_merging'])
+    parser.add_argument('--top-k', type=int, default=6)
+    parser.add_argument('--limit', type=int, default=None, help='Only use the first N benchmark questions.')
+    args = parser.parse_args()
+
+    with open("eval_questions/benchmark.json", 'r') as file:
+        questions = json.load(file)['questions'][:args.limit]
+
+    bundle = IndexRegistry(args.root).load_bundle()
+    embeddings = bundle.embeddings[args.retriever_type]
+    partitions = PaperPartitions(bundle.indexes[args.retriever_type], embeddings)
+    embed_model = get_embed_model()
+    query_embeddings = embed_queries(embed_model, questions)
+
+    full_retriever = bundle.indexes[args.retriever_type].as_retriever(similarity_top_k=args.top_k)
+    routed_retriever = PartitionedRetriever(partitions, embed_model, args.top_k)
+    # Warm up both paths (thread pool, docstore) before timing
+    timed_retrieve(full_retriever, questions[0], query_embeddings[0])
+    timed_retrieve(routed_retriever, questions[0], query_embeddings[0])
+
+    scanned, full_scans, full_latency, routed_latency, recall = [], 0, [], [], []
+    for question, query_embedding in zip(questions, query_embeddings):
+        full, elapsed = timed_retrieve(full_retriever, question, query_embedding)
+        full_latency.append(elapsed)
+        routed, elapsed = timed_retrieve(routed_retriever, question, query_embedding)
+        routed_latency.append(elapsed)
+
+        papers = partitions.route(question, query_embedding)
+        full_scans += papers is None
+        scanned.append(1.0 if papers is None else len(partitions.rows_for(papers)) / len(embeddings))
+        full_ids = {n.node.node_id for n in full}
+        recall.append(len(full_ids & {n.node.node_id for n in routed}) / len(full_ids))
+
+    print(f"Partitions: {len(partitions.papers)}, nodes: {len(embeddings)}, questions: {len(questions)}")
+    print(f"Questions routed to a full scan: {full_scans} ({full_scans / len(questions):.1%})")
+    print(f"Nodes scanned after routing: {np.mean(scanned):.1%} of the index")
+    print(f"Retrieval latency, full scan: {1000 * np.mean(full_latency):.2f} ms, routed: {1000 * np.mean(routed_latency):.2f} ms")
+    print(f"Full-scan top-{args.top_k} nodes kept by routed search: {np.mean(recall):.1%} "
+          f"(worst question: {np.min(recall):.0%})")
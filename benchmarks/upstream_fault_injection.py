@@ -0,0 +1,249 @@
+"""
+Fault-injection harness for the upstream layer (upstream.py).
+
+Starts a local fake OpenAI server (chat completions and embeddings) that answers most
+requests after a short delay but injects slow responses, 503s and dropped connections at
+configurable rates, then sends the same calls through:
+- default: the llama-index OpenAI clients as configured before upstream.py (SDK retries,
+  60 s timeout, llama-index's own retry loop),
+- retries: the pooled upstream transport with deadlines and jittered retries,
+- hedged: the same plus hedging after the p95 of recent latencies, within the default
+  hedge budget (about 5% of calls).
+
+It reports latency percentiles, errors, requests served, TCP connections opened and hedges
+sent per client and scenario. Neo4j is not covered: faking the bolt protocol is out of scope, and
+PooledNeo4jGraphStore goes through the same UpstreamPolicy.call exercised here.
+
+Usage (from the project root):
+    python -m benchmarks.upstream_fault_injection --calls 200 --concurrency 8
+"""
+import argparse
+import asyncio
+import base64
+import json
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import httpx
+import numpy as np
+import pandas as pd
+from llama_index.embeddings.openai import OpenAIEmbedding
+from llama_index.llms.openai import OpenAI
+from upstream import AsyncUpstreamTransport, UpstreamOpenAIEmbedding, UpstreamPolicy, UpstreamTransport
+
+SCENARIOS = {
+    'healthy': {'slow_rate': 0.0, 'fail_rate': 0.0, 'drop_rate': 0.0},
+    'slow_tail': {'slow_rate': 0.03, 'fail_rate': 0.0, 'drop_rate': 0.0},
+    'errors': {'slow_rate': 0.0, 'fail_rate': 0.1, 'drop_rate': 0.02},
+    'mixed': {'slow_rate': 0.03, 'fail_rate': 0.05, 'drop_rate': 0.02},
+}
+
+EMBEDDING_DIMENSIONS = 8
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    # Keep-alive, so connection pooling on the client side is visible in the connection count
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.stats['connections'] += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b"{}")
+        faults = self.server.faults
+        self.server.stats['requests'] += 1
+
+        roll = random.random()
+        if roll < faults['drop_rate']:
+            # Connection reset without a response
+            self.close_connection = True
+            self.connection.close()
+            return
+        if roll < faults['drop_rate'] + faults['fail_rate']:
+            self._reply(503, {'error': {'message': "injected overload", 'type': "server_error"}})
+            return
+        delay = random.uniform(*self.server.base_latency)
+        if roll < faults['drop_rate'] + faults['fail_rate'] + faults['slow_rate']:
+            delay = self.server.slow_seconds
+        time.sleep(delay)
+
+        if self.path.endswith("/embeddings"):
+            self._reply(200, self._embeddings(body))
+        else:
+            self._reply(200, {
+                'id': "chatcmpl-fake", 'object': "chat.completion", 'created': int(time.time()), 'model': body['model'],
+                'choices': [{'index': 0, 'finish_reason': "stop",
+                             'message': {'role': "assistant", 'content': "fake answer"}}],
+                'usage': {'prompt_tokens': 1, 'completion_tokens': 2, 'total_tokens': 3},
+            })
+
+    def _embeddings(self, body):
+        inputs = body['input'] if isinstance(body['input'], list) else [body['input']]
+        data = []
+        for index, _ in enumerate(inputs):
+            vector = np.random.rand(EMBEDDING_DIMENSIONS).astype(np.float32)
+            # The OpenAI SDK asks for base64 unless an encoding format is given
+            embedding = (base64.b64encode(vector.tobytes()).decode()
+                         if body.get('encoding_format') == "base64" else vector.tolist())
+            data.append({'object': "embedding", 'index': index, 'embedding': embedding})
+        return {'object': "list", 'data': data, 'model': body['model'],
+                'usage': {'prompt_tokens': 1, 'total_tokens': 1}}
+
+    def _reply(self, status, payload):
+        content = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', "application/json")
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients hang up on slow responses once a hedge or retry has won; that is expected here
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def start_fake_server(base_latency=(0.02, 0.05), slow_seconds=2.0):
+    server = FakeOpenAIServer(("127.0.0.1", 0), FakeOpenAIHandler)
+    server.base_latency = base_latency
+    server.slow_seconds = slow_seconds
+    server.faults = SCENARIOS['healthy']
+    server.stats = {'requests': 0, 'connections': 0}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def make_clients(config, api_base, timeout):
+    """LLM and embedding model for one client configuration."""
+    credentials = {'api_key': "fake", 'api_base': api_base}
+    if config == 'default':
+        return (OpenAI(model="gpt-4o-mini", **credentials),
+                OpenAIEmbedding(model="text-embedding-3-small", **credentials), [])
+
+    clients = {}
+    policies = []
+    for name in ('llm', 'embeddings'):
+        # Hedging is opt-in for the LLM in production; both are hedged here to compare
+        policy = UpstreamPolicy(name, timeout=timeout, max_retries=3,
+                                hedge_percentile=95.0 if config == 'hedged' else None)
+        policies.append(policy)
+        clients[name] = {
+            'max_retries': 0,
+            'timeout': timeout,
+            'http_client': httpx.Client(transport=UpstreamTransport(policy)),
+            'async_http_client': httpx.AsyncClient(transport=AsyncUpstreamTransport(policy)),
+        }
+    return (OpenAI(model="gpt-4o-mini", **credentials, **clients['llm']),
+            UpstreamOpenAIEmbedding(model="text-embedding-3-small", **credentials, **clients['embeddings']),
+            policies)
+
+
+def timed(call):
+    start = time.perf_counter()
+    try:
+        call()
+        return time.perf_counter() - start, None
+    except Exception as e:
+        return time.perf_counter() - start, type(e).__name__
+
+
+def run_calls(llm, embed_model, calls, concurrency):
+    """Alternate LLM and embedding calls from `concurrency` threads."""
+    def one(index):
+        if index % 2:
+            return timed(lambda: llm.complete(f"question {index}"))
+        return timed(lambda: embed_model.get_query_embedding(f"question {index}"))
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(one, range(calls)))
+
+
+def run_async_calls(llm, calls, concurrency):
+    async def main():
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one(index):
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    await llm.acomplete(f"question {index}")
+                    return time.perf_counter() - start, None
+                except Exception as e:
+                    return time.perf_counter() - start, type(e).__name__
+
+        return await asyncio.gather(*(one(index) for index in range(calls)))
+
+    return asyncio.run(main())
+
+
+def hedge_count(policies):
+    return sum(policy.counters['hedges'] for policy in policies)
+
+
+def summarize(scenario, config, mode, results, server_stats, hedges):
+    latencies = np.array([latency for latency, _ in results])
+    errors = [error for _, error in results if error is not None]
+    return {
+        'Scenario': scenario,
+        'Client': config,
+        'Mode': mode,
+        'P50ms': 1000 * np.percentile(latencies, 50),
+        'P95ms': 1000 * np.percentile(latencies, 95),
+        'P99ms': 1000 * np.percentile(latencies, 99),
+        'MaxMs': 1000 * latencies.max(),
+        'ErrorRate': len(errors) / len(results),
+        'Errors': ",".join(sorted(set(errors))),
+        'Requests': server_stats['requests'],
+        'Connections': server_stats['connections'],
+        'Hedges': hedges,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--slow-seconds', type=float, default=2.0, help="Latency of an injected slow response.")
+    parser.add_argument('--timeout', type=float, default=5.0, help="Upstream deadline for the pooled clients.")
+    parser.add_argument('--scenarios', nargs='+', default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument('--clients', nargs='+', default=['default', 'retries', 'hedged'],
+                        choices=['default', 'retries', 'hedged'])
+    args = parser.parse_args()
+
+    server = start_fake_server(slow_seconds=args.slow_seconds)
+    api_base = f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+    rows = []
+    for scenario in args.scenarios:
+        for config in args.clients:
+            llm, embed_model, policies = make_clients(config, api_base, args.timeout)
+            # Warm up without faults so the hedged client has latencies to start from
+            server.faults = SCENARIOS['healthy']
+            run_calls(llm, embed_model, 100, args.concurrency)
+
+            server.faults = SCENARIOS[scenario]
+            for mode in ('sync', 'async'):
+                server.stats = {'requests': 0, 'connections': 0}
+                hedges_before = hedge_count(policies)
+                if mode == 'sync':
+                    results = run_calls(llm, embed_model, args.calls, args.concurrency)
+                else:
+                    results = run_async_calls(llm, args.calls, args.concurrency)
+                rows.append(summarize(scenario, config, mode, results, server.stats,
+                                      hedge_count(policies) - hedges_before))
+                print(pd.DataFrame(rows[-1:]).to_string(index=False, header=len(rows) == 1))
+
+    print()
+    print(pd.DataFrame(rows).round(3).to_string(index=False))
+    server.shutdown()
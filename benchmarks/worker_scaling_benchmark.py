@@ -0,0 +1,113 @@
+"""
+Measures memory and throughput of the gunicorn multi-worker mode at 1/2/4/8 workers.
+
+For each worker count it starts `gunicorn -c gunicorn.conf.py main:app`, waits for the
+service to answer, records RSS and PSS (proportional set size, which splits shared pages
+between the processes sharing them) of every worker, then sends the benchmark questions
+to /ask from concurrent clients and reports requests per second.
+
+Usage (from the project root):
+    python -m benchmarks.worker_scaling_benchmark --workers 1 2 4 8 --requests 40
+"""
+import argparse
+import json
+import os
+import subprocess
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from dotenv import load_dotenv
+
+
+def read_memory_kb(pid):
+    """Return (rss, pss) in kB for a process, from /proc/<pid>/smaps_rollup."""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as smaps:
+        for line in smaps:
+            parts = line.split()
+            if parts[0] in ("Rss:", "Pss:"):
+                values[parts[0][:-1]] = int(parts[1])
+    return values.get("Rss", 0), values.get("Pss", 0)
+
+
+def worker_pids(master_pid):
+    with open(f"/proc/{master_pid}/task/{master_pid}/children") as children:
+        return [int(pid) for pid in children.read().split()]
+
+
+def wait_until_ready(base_url, expected_workers, master_pid, timeout=600):
+    # /admin/indexes answers once the indexes are loaded; it needs the admin token when one is set.
+    headers = {"X-Admin-Token": os.environ["ADMIN_TOKEN"]} if os.getenv("ADMIN_TOKEN") else {}
+    request = urllib.request.Request(f"{base_url}/admin/indexes", headers=headers)
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(request, timeout=5):
+                if len(worker_pids(master_pid)) >= expected_workers:
+                    return
+        except urllib.error.HTTPError as e:
+            if e.code in (401, 403):
+                raise RuntimeError(f"{base_url}/admin/indexes refused the readiness probe ({e.code}); "
+                                   f"check ADMIN_TOKEN") from e
+        except OSError:
+            pass
+        time.sleep(2)
+    raise TimeoutError(f"Service at {base_url} did not become ready within {timeout}s")
+
+
+def ask(base_url, question, retriever_type):
+    body = json.dumps({"question": question, "retriever_type": retriever_type}).encode()
+    request = urllib.request.Request(f"{base_url}/ask", data=body, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=300) as response:
+        return response.status
+
+
+def run_worker_count(workers, questions, requests, concurrency, retriever_type, port):
+    env = dict(os.environ, WEB_CONCURRENCY=str(workers), BIND=f"127.0.0.1:{port}")
+    server = subprocess.Popen(["gunicorn", "-c", "gunicorn.conf.py", "main:app"], env=env)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        wait_until_ready(base_url, workers, server.pid)
+        pids = worker_pids(server.pid)
+        memory = [read_memory_kb(pid) for pid in pids]
+        master_rss, master_pss = read_memory_kb(server.pid)
+
+        batch = [questions[i % len(questions)] for i in range(requests)]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            statuses = list(pool.map(lambda q: ask(base_url, q, retriever_type), batch))
+        elapsed = time.perf_counter() - start
+
+        return {
+            'Workers': workers,
+            'MasterRSSMB': master_rss / 1024,
+            'MeanWorkerRSSMB': sum(rss for rss, _ in memory) / len(memory) / 1024,
+            'MeanWorkerPSSMB': sum(pss for _, pss in memory) / len(memory) / 1024,
+            'TotalPSSMB': (master_pss + sum(pss for _, pss in memory)) / 1024,
+            'Requests': requests,
+            'Failed': sum(status != 200 for status in statuses),
+            'RequestsPerSecond': requests / elapsed,
+        }
+    finally:
+        server.terminate()
+        server.wait(timeout=60)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--requests', type=int, default=40)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--retriever-type', default='base')
+    parser.add_argument('--port', type=int, default=8100)
+    args = parser.parse_args()
+    load_dotenv()
+
+    with open("eval_questions/benchmark.json", 'r') as file:
+        benchmark_questions = json.load(file)['questions']
+
+    rows = [run_worker_count(n, benchmark_questions, args.requests, args.concurrency, args.retriever_type, args.port)
+            for n in args.workers]
+    print(pd.DataFrame(rows).round(1).to_string(index=False))
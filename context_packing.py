@@ -0,0 +1,174 @@
+import re
+from typing import Callable, Dict, List, Optional
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+from llama_index.core.postprocessor.types import BaseNodePostprocessor
+from llama_index.core.schema import MetadataMode, NodeWithScore, QueryBundle
+from llama_index.core.utils import get_tokenizer
+
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def _longest_overlap(left, right):
+    """
+    Length of the longest suffix of `left` that is also a prefix of `right`.
+
+    Uses the KMP prefix function over `right + sep + left`, so it runs in linear time
+    instead of trying every candidate overlap length.
+    """
+    combined = right + "\x00" + left
+    prefix = [0] * len(combined)
+    for i in range(1, len(combined)):
+        k = prefix[i - 1]
+        while k > 0 and combined[i] != combined[k]:
+            k = prefix[k - 1]
+        if combined[i] == combined[k]:
+            k += 1
+        prefix[i] = k
+    return prefix[-1]
+
+
+def _shingles(text, size=3):
+    """Set of word n-grams used for near-duplicate detection."""
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < size:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def _jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class ContextPackingPostprocessor(BaseNodePostprocessor):
+    """
+    Shrinks the retrieved context before synthesis.
+
+    Runs three passes over the retrieved nodes, highest score first:
+    1. merges overlapping spans that come from the same document (sentence windows,
+       auto-merged parents and their children),
+    2. drops chunks whose word shingles are near-duplicates of an already kept chunk,
+    3. packs what is left into `token_budget` tokens.
+
+    Token counts before and after packing are accumulated in `stats` so they can be
+    reported per retriever.
+    """
+
+    token_budget: int = Field(default=2048, description="Maximum number of context tokens passed to the LLM.")
+    min_overlap_chars: int = Field(default=40, description="Minimum shared span, in characters, to merge two chunks.")
+    duplicate_threshold: float = Field(default=0.8, description="Shingle Jaccard similarity above which a chunk is a duplicate.")
+
+    _tokenizer: Callable = PrivateAttr()
+    _stats: Dict[str, int] = PrivateAttr()
+
+    def __init__(self, tokenizer: Optional[Callable] = None, **kwargs):
+        super().__init__(**kwargs)
+        self._tokenizer = tokenizer or get_tokenizer()
+        self.reset_stats()
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "ContextPackingPostprocessor"
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return dict(self._stats)
+
+    def reset_stats(self):
+        self._stats = {"queries": 0, "nodes_in": 0, "nodes_out": 0, "tokens_in": 0, "tokens_out": 0}
+
+    def count_tokens(self, nodes: List[NodeWithScore]) -> int:
+        return sum(self._size(n) for n in nodes)
+
+    def _size(self, candidate):
+        """Tokens the synthesizer will see for `candidate`, metadata included."""
+        return len(self._tokenizer(candidate.node.get_content(metadata_mode=MetadataMode.LLM)))
+
+    def _postprocess_nodes(
+            self,
+            nodes: List[NodeWithScore],
+            query_bundle: Optional[QueryBundle] = None,
+    ) -> List[NodeWithScore]:
+        tokens_in = self.count_tokens(nodes)
+        ranked = sorted(nodes, key=lambda n: n.score or 0.0, reverse=True)
+
+        packed = self._pack(self._deduplicate(self._merge_overlaps(ranked)))
+
+        self._stats["queries"] += 1
+        self._stats["nodes_in"] += len(nodes)
+        self._stats["nodes_out"] += len(packed)
+        self._stats["tokens_in"] += tokens_in
+        self._stats["tokens_out"] += self.count_tokens(packed)
+        return packed
+
+    def _merge_overlaps(self, ranked):
+        kept = []
+        for candidate in ranked:
+            doc_id = candidate.node.ref_doc_id or candidate.node.metadata.get("file_name")
+            text = candidate.node.get_content()
+            merged = False
+            if doc_id is not None:
+                for existing in kept:
+                    if (existing.node.ref_doc_id or existing.node.metadata.get("file_name")) != doc_id:
+                        continue
+                    existing_text = existing.node.get_content()
+                    if text in existing_text:
+                        merged = True
+                    elif existing_text in text:
+                        existing.node.set_content(text)
+                        merged = True
+                    else:
+                        tail = _longest_overlap(existing_text, text)
+                        head = _longest_overlap(text, existing_text)
+                        if max(tail, head) >= self.min_overlap_chars:
+                            if tail >= head:
+                                existing.node.set_content(existing_text + text[tail:])
+                            else:
+                                existing.node.set_content(text + existing_text[head:])
+                            merged = True
+                    if merged:
+                        break
+            if not merged:
+                kept.append(candidate)
+        return kept
+
+    def _deduplicate(self, ranked):
+        kept = []
+        kept_shingles = []
+        for candidate in ranked:
+            shingles = _shingles(candidate.node.get_content())
+            if any(_jaccard(shingles, other) >= self.duplicate_threshold for other in kept_shingles):
+                continue
+            kept.append(candidate)
+            kept_shingles.append(shingles)
+        return kept
+
+    def _pack(self, ranked):
+        packed = []
+        used = 0
+        for candidate in ranked:
+            size = self._size(candidate)
+            if used + size > self.token_budget:
+                if packed:
+                    continue
+                # The best chunk alone is over budget: truncate it instead of dropping it for lower-ranked ones.
+                size = self._truncate(candidate, self.token_budget)
+            packed.append(candidate)
+            used += size
+        return packed
+
+    def _truncate(self, candidate, budget):
+        """
+        Cuts the text of `candidate` until it fits in `budget` tokens, counted the same way as
+        in `_pack` (metadata included). Returns the resulting size.
+        """
+        content = candidate.node.get_content()
+        size = self._size(candidate)
+        while size > budget and content:
+            ratio = min(budget / size, 1.0)
+            content = content[:int(len(content) * ratio)]
+            candidate.node.set_content(content)
+            size = self._size(candidate)
+        return size
@@ -0,0 +1,95 @@
+import logging
+import os
+from upstream import UpstreamOpenAIEmbedding, openai_client_kwargs
+
+logger = logging.getLogger(__name__)
+
+OPENAI_EMBED_MODEL = "text-embedding-3-small"
+DEFAULT_LOCAL_EMBED_MODEL = "BAAI/bge-small-en-v1.5"
+# Texts per forward pass of the local model; the OpenAI backend keeps OpenAIEmbedding's default of 100
+DEFAULT_LOCAL_BATCH_SIZE = 32
+
+
+def get_embed_model(backend=None, model_name=None, batch_size=None, quantize=None, num_threads=None):
+    """
+    Create the embedding model used for queries and index builds.
+
+    Every argument falls back to an environment variable, so the backend can be switched
+    in .env without code changes:
+        EMBED_BACKEND       "openai" (default) or "local"
+        LOCAL_EMBED_MODEL   Hugging Face model for the local backend (default BAAI/bge-small-en-v1.5)
+        EMBED_BATCH_SIZE    texts per forward pass / API call (default 32 local, 100 OpenAI)
+        EMBED_QUANTIZE      "int8" to apply dynamic int8 quantization to the local model's linear layers
+        EMBED_NUM_THREADS   CPU threads torch may use for local inference
+
+    Indexes must be queried with the model they were embedded with; use reembed_indexes.py
+    to build a new index version after switching.
+
+    Returns:
+    BaseEmbedding: The configured embedding model.
+    """
+    backend = (backend or os.getenv("EMBED_BACKEND", "openai")).lower()
+    batch_size = batch_size or os.getenv("EMBED_BATCH_SIZE")
+
+    if backend == "openai":
+        batch_kwargs = {'embed_batch_size': int(batch_size)} if batch_size else {}
+        return UpstreamOpenAIEmbedding(
+            model=model_name or OPENAI_EMBED_MODEL, **batch_kwargs, **openai_client_kwargs('embeddings')
+        )
+    if backend != "local":
+        raise ValueError(f"Unknown embedding backend: {backend}")
+
+    # Local inference pulls in torch; only import it when the local backend is selected
+    import torch
+    from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+
+    batch_size = int(batch_size or DEFAULT_LOCAL_BATCH_SIZE)
+
+    num_threads = num_threads or os.getenv("EMBED_NUM_THREADS")
+    if num_threads:
+        torch.set_num_threads(int(num_threads))
+
+    embed_model = HuggingFaceEmbedding(
+        model_name=model_name or os.getenv("LOCAL_EMBED_MODEL", DEFAULT_LOCAL_EMBED_MODEL),
+        embed_batch_size=batch_size,
+        device="cpu"
+    )
+
+    quantize = quantize or os.getenv("EMBED_QUANTIZE")
+    if quantize:
+        if quantize != "int8":
+            raise ValueError(f"Unsupported embedding quantization: {quantize}")
+        # Dynamic quantization: int8 weights for every Linear layer, activations quantized on the fly
+        embed_model._model = torch.quantization.quantize_dynamic(
+            embed_model._model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+
+    logger.info(f"Local embedding model {embed_model.model_name} (batch={batch_size}, "
+                f"quantize={quantize or 'none'}, threads={torch.get_num_threads()})")
+    return embed_model
+
+
+def embed_queries(embed_model, queries):
+    """
+    Embed many queries in one batched call.
+
+    llama-index only batches text embeddings. Local models such as BGE embed queries with
+    an instruction prefix, so they go through the model's "query" prompt instead.
+    """
+    queries = list(queries)
+    if is_local_embed_model(embed_model):
+        return embed_model._embed(queries, prompt_name="query")
+    return embed_model.get_text_embedding_batch(queries)
+
+
+def is_local_embed_model(embed_model):
+    # Checked by module name so the OpenAI backend never has to import torch
+    return type(embed_model).__module__.startswith("llama_index.embeddings.huggingface")
+
+
+def describe_embed_model(embed_model):
+    """Identify an embedding model, as recorded in an index version's manifest."""
+    return {
+        'backend': "local" if is_local_embed_model(embed_model) else "openai",
+        'model_name': embed_model.model_name,
+    }
@@ -6,8 +6,9 @@ import logging
 import pandas as pd
 from llama_index.core import StorageContext
 from utils import run_experiment, load_config
+from results_store import ResultsStore
 from llama_index.llms.openai import OpenAI
-from llama_index.embeddings.openai import OpenAIEmbedding
+from embeddings import get_embed_model
 from tonic_validate import ValidateScorer, ValidateApi, Benchmark
 from llama_index.core.retrievers import AutoMergingRetriever
 from tonic_validate.metrics import (
@@ -46,7 +47,7 @@ def initialize_environment():
 
 def setup_llm_and_embeddings():
     llm = OpenAI(model="gpt-4o-mini", temperature=0.0)
-    embed_model = OpenAIEmbedding(model="text-embedding-3-small")
+    embed_model = get_embed_model()
     Settings.llm = llm
     Settings.embed_model = embed_model
     return llm, embed_model
@@ -128,13 +129,15 @@ def load_benchmark():
     return questions, ground_truths
 
 
-def run_experiments(experiments, scorer, benchmark, validate_api):
+def run_experiments(experiments, scorer, benchmark, validate_api, results_store=None):
     results_df = pd.DataFrame(columns=['Run', 'Experiment', 'OverallScores'])
+    results_store = results_store or ResultsStore()
     for name, engine in experiments.items():
         try:
             results = run_experiment(name, engine, scorer,
                                      benchmark, validate_api,
-                                     "benchmark_id", upload_results=True, runs=3)
+                                     "benchmark_id", upload_results=True, runs=3,
+                                     results_store=results_store)
             results_df = pd.concat([results_df, results], ignore_index=True)
         except Exception as e:
             logging.error(f"Error running experiment {name}: {e}")
@@ -1,74 +1,184 @@
+import argparse
 import logging
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-from scipy.stats import shapiro, levene, f_oneway
-from statsmodels.stats.multicomp import pairwise_tukeyhsd
+from scipy.stats import shapiro, f as f_distribution
 import ast
-
-
-# Statistical Analysis
-def perform_statistical_analysis(df):
-    # Convert string representations of dictionaries to actual dictionaries
-    df['OverallScores'] = df['OverallScores'].apply(ast.literal_eval)
-
-    df['RetrievalPrecision'] = df['OverallScores'].apply(lambda x: x['retrieval_precision'])
-    alpha = 0.05
-
-    # Shapiro-Wilk test
-    for exp in df['Experiment'].unique():
-        stat, p = shapiro(df[df['Experiment'] == exp]['RetrievalPrecision'])
-        print(f"{exp} - Normality test: Statistics={stat}, p={p}")
-
-    # Levene's test for equal variances
-    stat, p = levene(*(df[df['Experiment'] == exp]['RetrievalPrecision'] for exp in df['Experiment'].unique()))
-    print(f"Levene’s test: Statistics={stat}, p={p}")
-
-    # ANOVA test
-    f_value, p_value = f_oneway(*(df[df['Experiment'] == exp]['RetrievalPrecision'] for exp in df['Experiment'].unique()))
-    print(f"ANOVA F-Value: {f_value}, P-Value: {p_value}")
-
-    # Tukey's HSD test
-    tukey_result = pairwise_tukeyhsd(endog=df['RetrievalPrecision'], groups=df['Experiment'], alpha=0.05)
-    tukey_result.plot_simultaneous()
-    plt.show()
-
-
-def perform_statistical_analysis_2(results_df):
-    # Prepare DataFrame for analysis
-    results_df['RetrievalPrecision'] = results_df['OverallScores'].apply(lambda x: x['retrieval_precision'])
-
-    # Normality Test
-    normality_results = {}
-    for exp in results_df['Experiment'].unique():
-        scores = results_df[results_df['Experiment'] == exp]['RetrievalPrecision']
-        stat, p = shapiro(scores)
-        normality_results[exp] = {'Shapiro-Wilk Stat': stat, 'p-value': p}
-
-    # Homogeneity of Variances Test
-    scores_list = [results_df[results_df['Experiment'] == exp]['RetrievalPrecision'] for exp in results_df['Experiment'].unique()]
-    stat, p = levene(*scores_list)
-    homogeneity_result = {'Levene Stat': stat, 'p-value': p}
-
-    # ANOVA
-    f_value, p_value = f_oneway(*scores_list)
-    anova_result = {'ANOVA F-Value': f_value, 'ANOVA P-Value': p_value}
-
-    # Tukey's HSD Test
-    tukey_result = pairwise_tukeyhsd(endog=results_df['RetrievalPrecision'], groups=results_df['Experiment'], alpha=0.05)
-    tukey_data = pd.DataFrame(data=tukey_result.summary().data[1:], columns=tukey_result.summary().data[0])
-
-    # Save results to Excel
-    with pd.ExcelWriter('statistical_analysis_results.xlsx') as writer:
-        pd.DataFrame(normality_results).T.to_excel(writer, sheet_name='Normality Test')
-        pd.DataFrame([homogeneity_result]).to_excel(writer, sheet_name='Homogeneity Test')
-        pd.DataFrame([anova_result]).to_excel(writer, sheet_name='ANOVA')
-        tukey_data.to_excel(writer, sheet_name='Tukey HSD Test')
-
-    logging.info('Statistical analysis results have been saved to statistical_analysis_results.xlsx')
+from results_store import ResultsStore, METRIC_PREFIX, metric_columns
+
+
+def scores_from_overall_scores(df):
+    """
+    Flatten the OverallScores column of an Excel export (the format run_experiment returns)
+    into metric_<name> columns, so older results can go through analyze_metrics.
+
+    Returns:
+    DataFrame: experiment, run_number and one column per metric.
+    """
+    scores = [ast.literal_eval(value) if isinstance(value, str) else value for value in df['OverallScores']]
+    metrics = pd.json_normalize(scores).add_prefix(METRIC_PREFIX)
+    return pd.concat([df[['Experiment', 'Run']].rename(columns={'Experiment': 'experiment', 'Run': 'run_number'}),
+                      metrics], axis=1)
+
+
+def one_way_anova(values, groups):
+    """
+    One-way ANOVA of every column of `values` at once.
+
+    Parameters:
+    values (np.ndarray): Observations x metrics; NaN marks a missing score.
+    groups (np.ndarray): Group code (0..k-1) of each observation.
+
+    Returns:
+    tuple: F statistics and p-values, one per metric.
+    """
+    present = ~np.isnan(values)
+    filled = np.where(present, values, 0.0)
+    membership = np.eye(groups.max() + 1)[groups]           # observations x groups
+
+    counts = membership.T @ present                          # groups x metrics
+    with np.errstate(invalid='ignore', divide='ignore'):
+        group_means = (membership.T @ filled) / counts
+        grand_means = filled.sum(axis=0) / present.sum(axis=0)
+        # Two passes (deviations from the group means) for numerical stability
+        deviations = np.where(present, values - group_means[groups], 0.0)
+        within = (deviations ** 2).sum(axis=0)
+        between = np.nansum(counts * (group_means - grand_means) ** 2, axis=0)
+
+        df_between = (counts > 0).sum(axis=0) - 1
+        df_within = present.sum(axis=0) - (counts > 0).sum(axis=0)
+        f_values = (between / df_between) / (within / df_within)
+    p_values = f_distribution.sf(f_values, df_between, df_within)
+    return f_values, p_values
+
+
+def levene_test(values, groups):
+    """Levene's test (median-centred, as scipy.stats.levene) of every column at once."""
+    frame = pd.DataFrame(values)
+    medians = frame.groupby(groups).transform('median').to_numpy()
+    return one_way_anova(np.abs(values - medians), groups)
+
+
+def bootstrap_ci(values, groups, n_boot=2000, confidence=0.95, seed=None, max_elements=2 ** 22):
+    """
+    Percentile bootstrap confidence intervals of the mean of every metric in every group.
+
+    A bootstrap resample of a group is drawn as multinomial counts of its observations, so all
+    resampled means of all metrics come out of a single matrix product per group.
+
+    Parameters:
+    values (np.ndarray): Observations x metrics; NaN marks a missing score.
+    groups (np.ndarray): Group code (0..k-1) of each observation.
+    n_boot (int): Bootstrap resamples.
+    confidence (float): Confidence level.
+    seed (int): Random seed, for reproducible intervals.
+    max_elements (int): Largest resample-weight matrix built at once; bigger groups are chunked.
+
+    Returns:
+    tuple: Lower and upper bounds, each groups x metrics.
+    """
+    rng = np.random.default_rng(seed)
+    n_groups = groups.max() + 1
+    lower = np.full((n_groups, values.shape[1]), np.nan)
+    upper = np.full((n_groups, values.shape[1]), np.nan)
+    tail = (1 - confidence) / 2 * 100
+
+    for group in range(n_groups):
+        group_values = values[groups == group]
+        if len(group_values) == 0:
+            continue
+        present = ~np.isnan(group_values)
+        filled = np.where(present, group_values, 0.0)
+        chunk = max(1, max_elements // len(group_values))
+        means = []
+        for start in range(0, n_boot, chunk):
+            size = min(chunk, n_boot - start)
+            # Resample indices, counted per resample: the same counts as a multinomial draw, much faster
+            indices = rng.integers(0, len(group_values), size=(size, len(group_values)))
+            indices += np.arange(size)[:, None] * len(group_values)
+            weights = np.bincount(indices.ravel(), minlength=size * len(group_values))
+            weights = weights.reshape(size, len(group_values)).astype(np.float64)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                means.append((weights @ filled) / (weights @ present))
+        means = np.vstack(means)
+        lower[group], upper[group] = np.nanpercentile(means, [tail, 100 - tail], axis=0)
+    return lower, upper
+
+
+def analyze_metrics(df, metrics=None, n_boot=2000, confidence=0.95, seed=0, normality=True):
+    """
+    Compare experiments on every metric at once.
+
+    Parameters:
+    df (DataFrame): One row per observation (a run, or a question) with an `experiment`
+        column and metric_<name> columns, e.g. ResultsStore.run_scores().
+    metrics (list): Columns to analyse; defaults to every metric_ column plus latency_seconds.
+    n_boot (int): Bootstrap resamples for the confidence intervals.
+    confidence (float): Confidence level of the intervals.
+    seed (int): Random seed for the bootstrap.
+    normality (bool): Also run a Shapiro-Wilk test per experiment and metric (not vectorized).
+
+    Returns:
+    dict: 'summary' (experiment x metric: n, mean, std, CI bounds and optionally the
+        Shapiro-Wilk p-value) and 'tests' (per metric: ANOVA and Levene statistics).
+    """
+    if metrics is None:
+        metrics = metric_columns(df) + (['latency_seconds'] if 'latency_seconds' in df.columns else [])
+    codes, experiments = pd.factorize(df['experiment'], sort=True)
+    values = df[metrics].to_numpy(dtype=float)
+
+    grouped = df.groupby(codes)[metrics]
+    counts, means, stds = grouped.count(), grouped.mean(), grouped.std()
+    lower, upper = bootstrap_ci(values, codes, n_boot=n_boot, confidence=confidence, seed=seed)
+
+    summary = pd.DataFrame({
+        'experiment': np.repeat(experiments, len(metrics)),
+        'metric': np.tile([metric.removeprefix(METRIC_PREFIX) for metric in metrics], len(experiments)),
+        'n': counts.to_numpy().ravel(),
+        'mean': means.to_numpy().ravel(),
+        'std': stds.to_numpy().ravel(),
+        'ci_lower': lower.ravel(),
+        'ci_upper': upper.ravel(),
+    })
+    if normality:
+        shapiro_p = [shapiro(column.dropna()).pvalue if column.count() >= 3 else np.nan
+                     for _, group in grouped for _, column in group.items()]
+        summary['shapiro_p'] = shapiro_p
+
+    f_values, anova_p = one_way_anova(values, codes)
+    levene_values, levene_p = levene_test(values, codes)
+    tests = pd.DataFrame({
+        'metric': [metric.removeprefix(METRIC_PREFIX) for metric in metrics],
+        'anova_f': f_values,
+        'anova_p': anova_p,
+        'levene_stat': levene_values,
+        'levene_p': levene_p,
+    })
+    return {'summary': summary, 'tests': tests}
 
 
 if __name__ == '__main__':
-    results_df = pd.read_excel('evaluation_results.xlsx')
-
-    perform_statistical_analysis(results_df)
-    perform_statistical_analysis_2(results_df)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Statistical comparison of the evaluated retrievers.")
+    parser.add_argument('--store', default="evaluation_results", help="ResultsStore written by run_experiment.")
+    parser.add_argument('--excel', default=None,
+                        help="Analyse an Excel export with an OverallScores column instead, e.g. evaluation_results.xlsx.")
+    parser.add_argument('--level', choices=['run', 'question'], default='run',
+                        help="Unit of observation: per-run means or individual questions.")
+    parser.add_argument('--bootstrap', type=int, default=2000)
+    parser.add_argument('--output', default='statistical_analysis_results.xlsx')
+    args = parser.parse_args()
+
+    if args.excel:
+        results_df = scores_from_overall_scores(pd.read_excel(args.excel))
+    elif args.level == 'run':
+        results_df = ResultsStore(args.store).run_scores()
+    else:
+        results_df = ResultsStore(args.store).questions()
+
+    analysis = analyze_metrics(results_df, n_boot=args.bootstrap)
+    print(analysis['summary'].to_string(index=False))
+    print(analysis['tests'].to_string(index=False))
+    with pd.ExcelWriter(args.output) as writer:
+        analysis['summary'].to_excel(writer, sheet_name='Summary', index=False)
+        analysis['tests'].to_excel(writer, sheet_name='ANOVA and Levene', index=False)
+    logging.info(f'Statistical analysis results have been saved to {args.output}')
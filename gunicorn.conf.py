@@ -0,0 +1,39 @@
+# Multi-worker serving: `gunicorn -c gunicorn.conf.py main:app`
+#
+# The app (and with it RAGEngine, its indexes and the reranker) is loaded once in the master
+# process and the uvicorn workers are forked from it, so the read-only index data is shared
+# copy-on-write instead of loaded once per worker. Embedding matrices are memory-mapped
+# (shared_indexes.py), so they stay shared even across reloads and worker restarts.
+import os
+from dotenv import load_dotenv
+
+# The reload watcher belongs in the workers, not the master: a master thread holding the reload
+# or logging lock while a worker is forked would deadlock the child. Keep the setting here and
+# turn it off for the app preloaded in the master (load_dotenv does not override it there).
+load_dotenv()
+reload_poll_seconds = float(os.getenv("INDEX_RELOAD_POLL_SECONDS") or 0)
+os.environ["INDEX_RELOAD_POLL_SECONDS"] = "0"
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+# Loading indexes and the reranker takes longer than gunicorn's default 30s
+timeout = int(os.getenv("WORKER_TIMEOUT", "120"))
+
+
+def when_ready(server):
+    # Runs in the master after the app is preloaded and before any worker is forked
+    from main import rag_engine
+    from shared_indexes import freeze_loaded_objects
+
+    rag_engine.warm_up()
+    freeze_loaded_objects()
+    server.log.info(f"Preloaded index version {rag_engine.index_version}, forking {workers} workers")
+
+
+def post_fork(server, worker):
+    # Threads do not survive fork, so each worker starts its own reload watcher
+    if reload_poll_seconds > 0:
+        from main import rag_engine
+        rag_engine.start_reload_watcher(reload_poll_seconds)
@@ -0,0 +1,216 @@
+import argparse
+import json
+import os
+import resource
+import tempfile
+from datetime import datetime
+from llama_index.core import StorageContext, load_index_from_storage
+from shared_indexes import share_vector_index
+from upstream import get_neo4j_graph_store
+
+# Retriever type -> index directory name inside a version (or directly under storage/ for the legacy layout)
+INDEX_DIRS = {
+    'base': 'base_index',
+    'sentence_window': 'sentence_index',
+    'auto_merging': 'auto_index',
+    'knowledge_graph': 'kg_index',
+}
+
+# Indexes whose embeddings are served from a shared memory-mapped matrix
+VECTOR_INDEX_TYPES = ('base', 'sentence_window', 'auto_merging')
+
+LEGACY_VERSION = "legacy"
+
+# Records which embedding model a version was built with
+EMBEDDING_MANIFEST = "embedding.json"
+
+
+def current_rss_mb():
+    """Resident set size of this process in MB, falling back to the peak RSS where /proc is unavailable."""
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class IndexBundle:
+    def __init__(self, version, indexes, embeddings=None):
+        """
+        One loaded, read-only version of all indexes.
+
+        Requests take a reference to the bundle they started with, so a reload can swap in a
+        new bundle without touching in-flight work. The bundle also caches the query engines
+        built on top of its indexes.
+
+        Parameters:
+        version (str): Version name the indexes were loaded from.
+        indexes (dict): Retriever type -> loaded index.
+        embeddings (dict): Retriever type -> shared EmbeddingMatrix, for the vector indexes.
+        """
+        self.version = version
+        self.indexes = indexes
+        self.embeddings = embeddings or {}
+        self.query_engines = {}
+        self.partitions = {}
+        self.loaded_at = datetime.now()
+
+    @property
+    def base_index(self):
+        return self.indexes['base']
+
+    @property
+    def sentence_index(self):
+        return self.indexes['sentence_window']
+
+    @property
+    def auto_merging_index(self):
+        return self.indexes['auto_merging']
+
+    @property
+    def knowledge_graph_index(self):
+        return self.indexes['knowledge_graph']
+
+
+class IndexRegistry:
+    def __init__(self, root="storage"):
+        """
+        Versioned index directories with an atomic "current" pointer.
+
+        Layout:
+            storage/versions/<version>/{base_index,sentence_index,auto_index,kg_index}
+            storage/CURRENT                  name of the version being served
+
+        CURRENT is only ever replaced with os.replace, so readers see either the old or the
+        new version name, never a partial write. Without a CURRENT file the registry serves
+        the legacy layout, storage/{base_index,...}.
+
+        Parameters:
+        root (str): Storage root directory.
+        """
+        self.root = root
+        self.versions_dir = os.path.join(root, "versions")
+        self.pointer_path = os.path.join(root, "CURRENT")
+        self._graph_store = None
+
+    def graph_store(self):
+        """
+        Neo4j graph store to serve the knowledge graph from when KG_GRAPH_STORE=neo4j, or None
+        to use the graph persisted with the index. One pooled store is shared by all versions.
+        """
+        if os.getenv("KG_GRAPH_STORE", "local") != "neo4j":
+            return None
+        if self._graph_store is None:
+            self._graph_store = get_neo4j_graph_store()
+        return self._graph_store
+
+    def list_versions(self):
+        if not os.path.isdir(self.versions_dir):
+            return []
+        return sorted(name for name in os.listdir(self.versions_dir)
+                      if os.path.isdir(os.path.join(self.versions_dir, name)))
+
+    def current_version(self):
+        try:
+            with open(self.pointer_path, 'r') as pointer:
+                return pointer.read().strip() or LEGACY_VERSION
+        except FileNotFoundError:
+            return LEGACY_VERSION
+
+    def version_dir(self, version):
+        if version == LEGACY_VERSION:
+            return self.root
+        return os.path.join(self.versions_dir, version)
+
+    def index_dir(self, version, retriever_type):
+        return os.path.join(self.version_dir(version), INDEX_DIRS[retriever_type])
+
+    def new_version(self):
+        """Create an empty version directory for a rebuild and return its name."""
+        version = datetime.now().strftime("%Y%m%d-%H%M%S")
+        os.makedirs(self.version_dir(version))
+        return version
+
+    def read_embedding_manifest(self, version):
+        """Embedding backend and model a version was built with, or None if it was not recorded."""
+        try:
+            with open(os.path.join(self.version_dir(version), EMBEDDING_MANIFEST), 'r') as manifest:
+                return json.load(manifest)
+        except FileNotFoundError:
+            return None
+
+    def write_embedding_manifest(self, version, description):
+        with open(os.path.join(self.version_dir(version), EMBEDDING_MANIFEST), 'w') as manifest:
+            json.dump(description, manifest, indent=2)
+
+    def set_current(self, version):
+        """Atomically point CURRENT at `version`."""
+        if version != LEGACY_VERSION and version not in self.list_versions():
+            raise ValueError(f"Unknown index version: {version}")
+        os.makedirs(self.root, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix=".CURRENT.")
+        try:
+            with os.fdopen(fd, 'w') as tmp:
+                tmp.write(version)
+                tmp.flush()
+                os.fsync(tmp.fileno())
+            os.replace(tmp_path, self.pointer_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def load_bundle(self, version=None, share_embeddings=True):
+        """
+        Load every index of `version` (default: the current one).
+
+        With `share_embeddings` the vector indexes are served from memory-mapped embedding
+        matrices (see shared_indexes.py), which worker processes share instead of copying.
+
+        Returns:
+        IndexBundle: The loaded indexes.
+        """
+        version = version or self.current_version()
+        if version != LEGACY_VERSION and version not in self.list_versions():
+            raise ValueError(f"Unknown index version: {version}")
+
+        indexes = {}
+        embeddings = {}
+        for retriever_type in INDEX_DIRS:
+            persist_dir = self.index_dir(version, retriever_type)
+            graph_store = self.graph_store() if retriever_type == 'knowledge_graph' else None
+            if graph_store is not None:
+                storage_context = StorageContext.from_defaults(persist_dir=persist_dir, graph_store=graph_store)
+            else:
+                storage_context = StorageContext.from_defaults(persist_dir=persist_dir)
+            indexes[retriever_type] = load_index_from_storage(storage_context)
+            if share_embeddings and retriever_type in VECTOR_INDEX_TYPES:
+                embeddings[retriever_type] = share_vector_index(indexes[retriever_type], persist_dir)
+        return IndexBundle(version, indexes, embeddings)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Inspect and publish versioned index directories.")
+    parser.add_argument('--root', default="storage")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('list', help="List versions and show the current one.")
+    subparsers.add_parser('new', help="Create an empty version directory to build indexes into.")
+    publish_parser = subparsers.add_parser('publish', help="Point CURRENT at a version.")
+    publish_parser.add_argument('version')
+    args = parser.parse_args()
+
+    registry = IndexRegistry(args.root)
+    if args.command == 'list':
+        current = registry.current_version()
+        for name in registry.list_versions():
+            print(("* " if name == current else "  ") + name)
+        if current == LEGACY_VERSION:
+            print(f"* {LEGACY_VERSION} ({args.root}/<index>)")
+    elif args.command == 'new':
+        print(registry.version_dir(registry.new_version()))
+    elif args.command == 'publish':
+        registry.set_current(args.version)
+        print(f"CURRENT -> {args.version}")
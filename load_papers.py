@@ -15,6 +15,7 @@ class PyMuPDFReader(BaseReader):
             input_files: Optional[List[Path]] = None,
             exclude_hidden: bool = True,
             file_metadata: Optional[Callable[[str], Dict]] = None,
+            cleaning_pipeline=None,
             **kwargs
     ):
         """
@@ -25,6 +26,8 @@ class PyMuPDFReader(BaseReader):
             input_files: Specific files to read.
             exclude_hidden: Whether to exclude hidden files.
             file_metadata: A function to extract file metadata.
+            cleaning_pipeline: Optional CleaningPipeline (see process_documents) applied to
+                each page as it is extracted.
             kwargs: Additional arguments for the BaseReader.
         """
         super().__init__(**kwargs)  # Initialize the base class
@@ -32,6 +35,7 @@ class PyMuPDFReader(BaseReader):
         self.input_dir = input_dir
         self.input_files = input_files or self._collect_files(input_dir)
         self.file_metadata = file_metadata
+        self.cleaning_pipeline = cleaning_pipeline
 
     def _collect_files(self, input_dir: Optional[str]) -> List[Path]:
         """Collect all PDF files from the directory."""
@@ -69,10 +73,10 @@ class PyMuPDFReader(BaseReader):
                     print(f"Processing file {index + 1}/{total_files}: {input_file}")
 
                 with fitz.open(input_file) as doc:
-                    text = ""
-                    for page_num in range(doc.page_count):
-                        page = doc.load_page(page_num)
-                        text += page.get_text()
+                    pages = (doc.load_page(page_num).get_text() for page_num in range(doc.page_count))
+                    if self.cleaning_pipeline is not None:
+                        pages = self.cleaning_pipeline.clean_pages(pages)
+                    text = "".join(pages)
 
                     # Extract metadata
                     metadata = self._extract_metadata(input_file)
@@ -1,10 +1,15 @@
-from fastapi import FastAPI, HTTPException
+import asyncio
+import hmac
+import os
+from fastapi import Depends, FastAPI, Header, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 import gradio as gr
 from pydantic import BaseModel
 from typing import Union
-from models import QuestionRequest, AnswerResponse
+from models import QuestionRequest, AnswerResponse, BatchQuestionRequest, BatchAnswer, ReloadRequest, ReloadResponse, IndexStatusResponse, UpstreamStatusResponse
 from rag_engine import RAGEngine
+from upstream import upstream_report
 
 app = FastAPI()
 rag_engine = RAGEngine()
@@ -18,19 +23,80 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+LOCAL_HOSTS = {"127.0.0.1", "::1", "localhost"}
+
+
+def require_admin(request: Request, x_admin_token: Union[str, None] = Header(default=None)):
+    """
+    Guard for the /admin routes, which can load a whole second index bundle.
+    With ADMIN_TOKEN set (e.g. in .env) the X-Admin-Token header must match it; without it
+    the routes only answer requests from localhost.
+    """
+    admin_token = os.getenv("ADMIN_TOKEN")
+    if admin_token:
+        if x_admin_token is None or not hmac.compare_digest(x_admin_token, admin_token):
+            raise HTTPException(status_code=401, detail="Invalid or missing X-Admin-Token")
+    elif request.client is None or request.client.host not in LOCAL_HOSTS:
+        raise HTTPException(status_code=403, detail="Admin routes are only served to localhost unless ADMIN_TOKEN is set")
+
 class GradioRequest(BaseModel):
     data: Union[list, dict]
 
 @app.post("/ask", response_model=AnswerResponse)
 async def ask_question(request: QuestionRequest):
     try:
-        answer = await rag_engine.ask_question(request.question, request.retriever_type)
+        answer = await rag_engine.ask_question(request.question, request.retriever_type, request.papers)
         return AnswerResponse(answer=answer)
     except ValueError as ve:
         raise HTTPException(status_code=400, detail=str(ve))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/ask/batch")
+async def ask_batch(request: BatchQuestionRequest):
+    # Streams one BatchAnswer JSON object per line, in completion order
+    items = [(item.question, item.retriever_type, item.papers) for item in request.items]
+
+    async def stream_answers():
+        async for result in rag_engine.ask_batch(items, max_concurrency=request.max_concurrency):
+            yield BatchAnswer(**result).model_dump_json() + "\n"
+
+    return StreamingResponse(stream_answers(), media_type="application/x-ndjson")
+
+@app.get("/admin/indexes", response_model=IndexStatusResponse, dependencies=[Depends(require_admin)])
+async def index_status():
+    return IndexStatusResponse(
+        loaded_version=rag_engine.index_version,
+        current_version=rag_engine.registry.current_version(),
+        previous_version=rag_engine.previous_index_version,
+        versions=rag_engine.registry.list_versions()
+    )
+
+@app.get("/admin/upstream", response_model=UpstreamStatusResponse, dependencies=[Depends(require_admin)])
+async def upstream_status():
+    return UpstreamStatusResponse(upstreams=upstream_report())
+
+@app.post("/admin/reload", response_model=ReloadResponse, dependencies=[Depends(require_admin)])
+async def reload_indexes(request: ReloadRequest):
+    try:
+        # Load in a worker thread so /ask keeps being served during the reload
+        stats = await asyncio.to_thread(rag_engine.reload, request.version)
+        return ReloadResponse(**stats)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/admin/rollback", response_model=ReloadResponse, dependencies=[Depends(require_admin)])
+async def rollback_indexes():
+    try:
+        stats = await asyncio.to_thread(rag_engine.rollback)
+        return ReloadResponse(**stats)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/run/predict")
 async def gradio_predict(request: GradioRequest):
     try:
@@ -56,7 +122,7 @@ iface = gr.Interface(
     fn=gradio_ask,
     inputs=[
         gr.Textbox(lines=2, placeholder="Enter your question here...", label="Question"),
-        gr.Radio(["base", "sentence_window", "auto_merging", "knowledge_graph"], label="Retriever Type")
+        gr.Radio(["auto", "base", "sentence_window", "auto_merging", "knowledge_graph"], label="Retriever Type")
     ],
     outputs="text",
     title="RAG Q&A System",
@@ -1,10 +1,51 @@
-from pydantic import BaseModel
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel, Field
 
 
 class QuestionRequest(BaseModel):
     question: str
     retriever_type: str
+    # Restrict retrieval to these papers, by file name ("llama.pdf") or stem ("llama")
+    papers: Optional[List[str]] = None
 
 
 class AnswerResponse(BaseModel):
-    answer: str
\ No newline at end of file
+    answer: str
+
+
+class BatchQuestionRequest(BaseModel):
+    items: List[QuestionRequest]
+    max_concurrency: int = Field(default=8, ge=1, le=64)
+
+
+class BatchAnswer(BaseModel):
+    index: int
+    question: str
+    retriever_type: str
+    answer: Optional[str] = None
+    error: Optional[str] = None
+
+
+class ReloadRequest(BaseModel):
+    version: Optional[str] = None
+
+
+class ReloadResponse(BaseModel):
+    version: str
+    previous_version: Optional[str] = None
+    load_seconds: float
+    rss_before_mb: float
+    rss_peak_mb: float
+    rss_after_mb: float
+
+
+class IndexStatusResponse(BaseModel):
+    loaded_version: str
+    current_version: str
+    previous_version: Optional[str] = None
+    versions: List[str]
+
+
+class UpstreamStatusResponse(BaseModel):
+    # Upstream name ('llm', 'embeddings', 'neo4j') -> latency percentiles, counters and settings
+    upstreams: Dict[str, Dict[str, Any]]
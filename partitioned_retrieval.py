@@ -0,0 +1,133 @@
+import os
+import re
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+from llama_index.core.base.base_retriever import BaseRetriever
+from llama_index.core.schema import NodeWithScore, QueryBundle
+
+# NumPy releases the GIL inside matrix products, so partitions can be scored in parallel threads
+_SCATTER_POOL = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1), thread_name_prefix="partition-search")
+
+
+class PaperPartitions:
+    def __init__(self, index, embeddings, max_partitions=3, route_margin=0.05):
+        """
+        Splits a vector index into one partition per paper, keyed by the `file_name` metadata
+        PyMuPDFReader attaches to every document.
+
+        Partitions are row subsets of the index's shared EmbeddingMatrix, so no data is
+        copied. Each partition also has a centroid embedding, used by the query router.
+
+        Parameters:
+        index (VectorStoreIndex): The vector index.
+        embeddings (EmbeddingMatrix): Shared embeddings of `index`.
+        max_partitions (int): Most partitions the router selects for one query; when more are
+            within `route_margin` of the best, the whole index is searched instead.
+        route_margin (float): Partitions whose centroid similarity is within this margin of
+            the best one are searched as well.
+        """
+        self.index = index
+        self.embeddings = embeddings
+        self.max_partitions = max_partitions
+        self.route_margin = route_margin
+
+        metadata = index.vector_store.data.metadata_dict
+        if not metadata:
+            metadata = {node.node_id: node.metadata for node in index.docstore.get_nodes(embeddings.node_ids)}
+        rows_by_paper = {}
+        for row, node_id in enumerate(embeddings.node_ids):
+            paper = metadata.get(node_id, {}).get('file_name', 'unknown')
+            rows_by_paper.setdefault(paper, []).append(row)
+
+        self.papers = sorted(rows_by_paper)
+        self.rows = {paper: np.asarray(rows_by_paper[paper]) for paper in self.papers}
+        centroids = np.stack([np.asarray(embeddings.matrix[self.rows[paper]]).mean(axis=0) for paper in self.papers])
+        self.centroids = centroids / np.linalg.norm(centroids, axis=1, keepdims=True)
+        # "llama.pdf" is mentioned as "LLaMA" in questions; match file stems as whole words
+        self._name_patterns = {
+            paper: re.compile(r"\b" + re.escape(os.path.splitext(paper)[0].replace('_', ' ')) + r"\b", re.IGNORECASE)
+            for paper in self.papers
+        }
+
+    def resolve(self, papers):
+        """Map user-supplied paper names ("llama" or "llama.pdf", any case) to partition keys."""
+        lookup = {}
+        for paper in self.papers:
+            lookup[paper.lower()] = paper
+            lookup[os.path.splitext(paper)[0].lower()] = paper
+        unknown = [paper for paper in papers if paper.lower() not in lookup]
+        if unknown:
+            raise ValueError(f"Unknown papers: {', '.join(unknown)}. Available: {', '.join(self.papers)}")
+        return list(dict.fromkeys(lookup[paper.lower()] for paper in papers))
+
+    def route(self, query_str, query_embedding):
+        """
+        Cheap query-to-partition routing.
+
+        Papers named in the question win outright; otherwise partitions are ranked by cosine
+        similarity between the query and their centroids, keeping those within
+        `route_margin` of the best. When more than `max_partitions` papers are that close
+        (or more than that are named), the question is not clearly about a few papers and
+        the whole index should be searched.
+
+        Returns:
+        list: Partition keys to search, or None for the whole index.
+        """
+        named = [paper for paper, pattern in self._name_patterns.items() if pattern.search(query_str)]
+        if named:
+            return named if len(named) <= self.max_partitions else None
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        scores = self.centroids @ (query / np.linalg.norm(query))
+        close = np.flatnonzero(scores >= scores.max() - self.route_margin)
+        if len(close) > self.max_partitions:
+            return None
+        return [self.papers[i] for i in close[np.argsort(-scores[close])]]
+
+    def rows_for(self, papers):
+        return np.concatenate([self.rows[paper] for paper in papers])
+
+    def search(self, query_embedding, papers, top_k):
+        """
+        Scatter-gather top-k: search every selected partition in parallel and merge. With
+        `papers` None the whole matrix is scanned in one pass instead.
+
+        Returns:
+        list: NodeWithScore for the overall top-k, best first.
+        """
+        if papers is None:
+            node_ids, scores = self.embeddings.top_k(query_embedding, top_k)[0]
+            candidates = list(zip(scores, node_ids))
+        else:
+            partial = _SCATTER_POOL.map(
+                lambda paper: self.embeddings.top_k(query_embedding, top_k, rows=self.rows[paper])[0], papers)
+            candidates = sorted(
+                ((score, node_id) for node_ids, scores in partial for node_id, score in zip(node_ids, scores)),
+                reverse=True
+            )[:top_k]
+        nodes = self.index.docstore.get_nodes([node_id for _, node_id in candidates])
+        return [NodeWithScore(node=node, score=score) for node, (score, _) in zip(nodes, candidates)]
+
+
+class PartitionedRetriever(BaseRetriever):
+    """
+    Vector retriever that only searches the partitions relevant to the query.
+
+    With `papers` set, exactly those partitions are searched; otherwise the router picks them.
+    """
+
+    def __init__(self, partitions: PaperPartitions, embed_model, similarity_top_k: int,
+                 papers: Optional[List[str]] = None):
+        super().__init__()
+        self._partitions = partitions
+        self._embed_model = embed_model
+        self._similarity_top_k = similarity_top_k
+        self._papers = partitions.resolve(papers) if papers else None
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        if query_bundle.embedding is None:
+            query_bundle.embedding = self._embed_model.get_agg_embedding_from_queries(query_bundle.embedding_strs)
+        # None (a cross-paper question) scans the whole index
+        papers = self._papers or self._partitions.route(query_bundle.query_str, query_bundle.embedding)
+        return self._partitions.search(query_bundle.embedding, papers, self._similarity_top_k)
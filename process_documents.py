@@ -1,6 +1,25 @@
 import os
 import pickle
+import re
+from collections import Counter
 from load_papers import PyMuPDFReader
+from utils import remove_nul_chars_from_string
+
+# Keywords to identify the start of the references section
+REFERENCE_MARKERS = ["\nReferences\n", "\nREFERENCES", "References\n", "Bibliography\n"]
+
+# Keywords that indicate sections after the references that should be preserved
+PRESERVATION_MARKERS = ["Appendix",
+                        "Complete Results for Top- pand Top- kDecoding",
+                        "\nA A DDITIONAL ANALYSIS\n",
+                        "Supplemental Material\n",
+                        "Question Answering\n",
+                        "Additional Material\n",
+                        "Additional Results: Relevant Document Scaling\n",
+                        "BERT Finetuning Hyperparameters\n",
+                        "ADDITIONAL ANALYSIS\n",
+                        "Development Set Results\n"]
+                        #"Analytic FIM for two-layer model\n"]
 
 
 def process_documents(input_dir, save_path):
@@ -17,10 +36,10 @@ def process_documents(input_dir, save_path):
     """
     # Check if the processed documents already exist in the save path
     if not os.path.exists(save_path):
-        # Load documents from the input directory
-        documents = PyMuPDFReader(input_dir=input_dir).load_data(show_progress=True, raise_on_error=False)
-        # Clean the loaded documents
-        documents = clean_data(documents)
+        # Load documents from the input directory, cleaning each page as it is extracted
+        documents = PyMuPDFReader(
+            input_dir=input_dir, cleaning_pipeline=default_cleaning_pipeline()
+        ).load_data(show_progress=True, raise_on_error=False)
         # Save the cleaned documents
         save_documents(documents, save_path)
     else:
@@ -58,18 +77,307 @@ def load_documents_from_file(file_path):
     return documents
 
 
-def clean_data(documents):
+class CleaningStage:
     """
-    Placeholder function to clean data.
+    One step of the cleaning pipeline.
+
+    Stages see a document one page at a time, in order, so they can keep state across
+    pages (repeated headers, a references section that started on an earlier page).
+    """
+
+    def reset(self):
+        """Called before the first page of every document."""
+
+    def clean_page(self, text):
+        return text
+
+    def flush(self):
+        """Called after the last page; returns any text the stage is still holding back."""
+        return ""
+
+
+class NulStripStage(CleaningStage):
+    """Removes NUL characters, which PostgreSQL-backed tools (e.g. Tonic Validate uploads) reject."""
+
+    def clean_page(self, text):
+        return remove_nul_chars_from_string(text)
+
+
+class HeaderFooterStage(CleaningStage):
+    """
+    Drops running headers and footers.
+
+    The first and last `max_lines` lines of each page are compared against the same
+    positions on earlier pages of the document; a line seen there at least `min_repeats`
+    times is removed. Page numbers ("12", "Page 3 of 20") are compared with their digits
+    masked so they match across pages.
+    """
+
+    _PAGE_NUMBER = re.compile(r"(?:page\s*)?\d+(?:\s*(?:of|/)\s*\d+)?", re.IGNORECASE)
+
+    def __init__(self, max_lines=2, min_repeats=2):
+        self.max_lines = max_lines
+        self.min_repeats = min_repeats
+        self.reset()
+
+    def reset(self):
+        self._seen = Counter()
+
+    def clean_page(self, text):
+        lines = text.split("\n")
+        trailing_newline = lines and lines[-1] == ""
+        if trailing_newline:
+            lines.pop()
+
+        positions = [("head", i) for i in range(min(self.max_lines, len(lines)))]
+        positions += [("foot", i) for i in range(min(self.max_lines, len(lines) - len(positions)))]
+        drop = set()
+        for side, offset in positions:
+            line_index = offset if side == "head" else len(lines) - 1 - offset
+            line = lines[line_index].strip()
+            key = (side, offset, "#" if self._PAGE_NUMBER.fullmatch(line) else line)
+            if key[2] and self._seen[key] >= self.min_repeats:
+                drop.add(line_index)
+            self._seen[key] += 1
+
+        kept = [line for i, line in enumerate(lines) if i not in drop]
+        return "\n".join(kept) + ("\n" if trailing_newline and kept else "")
+
+
+class HyphenationRepairStage(CleaningStage):
+    """
+    Rejoins words hyphenated across line and page breaks ("ob-\njective" -> "objective").
+
+    The hyphen is kept only when the compound itself ("machine-generated") has been seen
+    unbroken earlier in the document or on the same page; halves that are both words on
+    their own ("per-\nform", "with-\nout") are joined. Only text around literal hyphens is
+    inspected, so pages are not tokenized as a whole.
+    """
+
+    _LEADING_WORD = re.compile(r"\w+")
+    # Fragments are short; only this many characters before a hyphen are inspected
+    _MAX_FRAGMENT = 64
+
+    def reset(self):
+        self._compounds = set()
+        self._carry = None
+
+    def flush(self):
+        carry, self._carry = self._carry, None
+        return carry + "-" if carry is not None else ""
+
+    def _trailing_word(self, piece):
+        """The word `piece` ends with, or None."""
+        # Matching the reversed tail at its start is far cheaper than searching for \w+\Z
+        word = self._LEADING_WORD.match(piece[:-self._MAX_FRAGMENT - 1:-1])
+        return word.group(0)[::-1] if word else None
+
+    def _learn_compounds(self, text):
+        """Record every unbroken "left-right" pair, e.g. both pairs of "state-of-the"."""
+        parts = text.split("-")
+        for left_part, right_part in zip(parts, parts[1:]):
+            left = self._trailing_word(left_part)
+            right = self._LEADING_WORD.match(right_part)
+            if left and right:
+                self._compounds.add(f"{left}-{right.group(0)}".lower())
+
+    def _separator(self, left, right):
+        return "-" if f"{left}-{right}".lower() in self._compounds else ""
+
+    def clean_page(self, text):
+        stripped = text.rstrip()
+        if stripped.endswith("-"):
+            # Normalise a page ending mid-word so it splits like any other line break
+            text = stripped + "\n"
+        if self._carry is not None:
+            text = text.lstrip()
+        # Splitting on the literal break is much cheaper than a regex anchored on \w+
+        pieces = text.split("-\n")
+        if "-" in text.replace("-\n", ""):
+            for piece in pieces:
+                if "-" in piece:
+                    self._learn_compounds(piece)
+        if len(pieces) == 1 and self._carry is None:
+            return text
+
+        output = []
+        if self._carry is not None:
+            # Previous page ended mid-word; the fragment was held back to be joined here
+            right = self._LEADING_WORD.match(pieces[0])
+            output.append(self._carry + (self._separator(self._carry, right.group(0)) if right else "-"))
+            self._carry = None
+        output.append(pieces[0])
+        for position in range(1, len(pieces)):
+            piece = pieces[position]
+            left = self._trailing_word(output[-1])
+            if position == len(pieces) - 1 and left and not piece.strip():
+                # Page ends mid-word: hold the fragment back until the next page
+                self._carry = left
+                output[-1] = output[-1][:-len(left)]
+                break
+            right = self._LEADING_WORD.match(piece)
+            output.append(self._separator(left, right.group(0)) if left and right else "-\n")
+            output.append(piece)
+        return "".join(output)
+
+
+class _MarkerSearch:
+    def __init__(self, markers):
+        """
+        Finds the earliest occurrence of any of several literal markers.
+
+        Markers are grouped by their first character after any leading newlines, and each
+        group is searched with one compiled alternation. Since the alternatives share that
+        character as a literal prefix, the regex engine skips ahead to it in a tight loop
+        instead of trying the pattern at every position, so a page is scanned once per group
+        rather than once per marker. Leading newlines and the exact marker are checked at the
+        few hits.
+
+        Parameters:
+        markers (list): Marker strings.
+        """
+        groups = {}
+        for marker in dict.fromkeys(markers):
+            core = marker.lstrip("\n")
+            groups.setdefault(core[0], []).append((marker, core))
+        self._groups = []
+        for first, members in groups.items():
+            rests = sorted({core[1:] for _, core in members}, key=len, reverse=True)
+            # The rest goes in a lookahead so a single-marker group does not compile to one long
+            # literal, which the regex engine scans for more slowly than a one-character prefix
+            pattern = re.compile(re.escape(first) + "(?=" + "|".join(map(re.escape, rests)) + ")")
+            # Markers with more leading newlines start earlier at the same hit, so try them first
+            members.sort(key=lambda member: len(member[0]) - len(member[1]), reverse=True)
+            reach = 1 + len(rests[0]) + len(members[0][0]) - len(members[0][1])
+            self._groups.append((pattern.search, members, reach))
+
+    def earliest(self, text, start=0):
+        """(position, marker) of the first occurrence of any marker at or after `start`, or None."""
+        best = None
+        for search, members, reach in self._groups:
+            match = search(text, start) if best is None else search(text, start, best[0] + reach)
+            while match is not None:
+                hit = match.start()
+                for marker, core in members:
+                    marker_start = hit - (len(marker) - len(core))
+                    if marker_start >= start and text.startswith(marker, marker_start):
+                        if best is None or marker_start < best[0]:
+                            best = (marker_start, marker)
+                        break
+                # Once a marker is found, only hits that could still start before it matter
+                match = search(text, hit + 1) if best is None else search(text, hit + 1, best[0] + reach)
+        return best
+
+
+class ReferenceSectionStage(CleaningStage):
+    """
+    Removes the references section, preserving sections that follow it such as appendices.
+
+    Text is dropped from the earliest reference marker up to the earliest preservation
+    marker after it (or to the end of the document); everything after a preserved section
+    starts is kept as is. Pages before the references section are only searched for the
+    reference markers.
+    """
+
+    def __init__(self, reference_markers=REFERENCE_MARKERS, preservation_markers=PRESERVATION_MARKERS):
+        self.reference_markers = list(reference_markers)
+        self.preservation_markers = list(preservation_markers)
+        self._references = _MarkerSearch(self.reference_markers)
+        self._preservations = _MarkerSearch(self.preservation_markers)
+        self.reset()
+
+    def reset(self):
+        self._state = "body"
+
+    def clean_page(self, text):
+        if self._state == "preserved":
+            return text
+
+        kept = ""
+        search_from = 0
+        if self._state == "body":
+            reference = self._references.earliest(text)
+            if reference is None:
+                return text
+            kept = text[:reference[0]]
+            search_from = reference[0] + len(reference[1])
+            self._state = "references"
+
+        preserved = self._preservations.earliest(text, search_from)
+        if preserved is None:
+            return kept
+        self._state = "preserved"
+        return kept + "\n" + text[preserved[0]:]
+
+
+class CleaningPipeline:
+    def __init__(self, stages):
+        """
+        Runs cleaning stages over a document page by page.
+
+        Parameters:
+        stages (list): CleaningStage instances, applied in order to every page.
+        """
+        self.stages = stages
+
+    def clean_pages(self, pages):
+        """
+        Clean one document given as an iterable of page texts.
+
+        Pages are consumed lazily, so this can wrap extraction directly.
+
+        Yields:
+        str: The cleaned text of each page.
+        """
+        for stage in self.stages:
+            stage.reset()
+        for page in pages:
+            yield self._run(page, self.stages)
+        # Text held back by a stage still has to go through the stages after it
+        for position, stage in enumerate(self.stages):
+            tail = stage.flush()
+            if tail:
+                yield self._run(tail, self.stages[position + 1:])
+
+    @staticmethod
+    def _run(text, stages):
+        for stage in stages:
+            text = stage.clean_page(text)
+        return text
+
+    def clean_text(self, text):
+        """Clean a whole document text, treated as a single page."""
+        return "".join(self.clean_pages([text]))
+
+
+def default_cleaning_pipeline():
+    """The stages applied to papers at extraction time."""
+    return CleaningPipeline([
+        NulStripStage(),
+        HeaderFooterStage(),
+        HyphenationRepairStage(),
+        ReferenceSectionStage(),
+    ])
+
+
+def clean_data(documents, pipeline=None):
+    """
+    Cleans already loaded documents, e.g. ones read from an older pickle.
+
+    Documents loaded through process_documents are cleaned page by page at extraction time
+    instead, which also lets the header/footer stage see page boundaries.
 
     Parameters:
     documents (list): List of documents to be cleaned.
+    pipeline (CleaningPipeline): Pipeline to apply; defaults to default_cleaning_pipeline().
 
     Returns:
     list: Cleaned documents.
     """
-    cleaned_documents = remove_references_from_documents(documents)
-    return cleaned_documents
+    pipeline = pipeline or default_cleaning_pipeline()
+    for doc in documents:
+        doc.text = pipeline.clean_text(doc.text)
+    return documents
 
 
 def remove_references_from_documents(documents):
@@ -82,53 +390,4 @@ def remove_references_from_documents(documents):
     Returns:
     cleaned_documents (list): List of documents with references removed.
     """
-
-    # Keywords to identify the start of the references section
-    reference_markers = ["\nReferences\n", "\nREFERENCES", "References\n", "Bibliography\n"]
-
-    # Keywords that indicate sections that should be preserved
-    preservation_markers = ["Appendix",
-                            "Complete Results for Top- pand Top- kDecoding",
-                            "\nA A DDITIONAL ANALYSIS\n",
-                            "Supplemental Material\n",
-                            "Question Answering\n",
-                            "Additional Material\n",
-                            "Additional Results: Relevant Document Scaling\n",
-                            "BERT Finetuning Hyperparameters\n",
-                            "ADDITIONAL ANALYSIS\n",
-                            "Development Set Results\n"]
-                            #"Analytic FIM for two-layer model\n"]
-
-    for doc in documents:
-        text = doc.text
-
-        # Find the position of the references section
-        ref_start_idx = None
-        for marker in reference_markers:
-            ref_start_idx = text.find(marker)
-            if ref_start_idx != -1:
-                break
-
-        if ref_start_idx != -1:
-            # Check if any preservation markers are found after references
-            remaining_text = text[ref_start_idx:]
-            preserve_start_idx = None
-            for preserve_marker in preservation_markers:
-                preserve_start_idx = remaining_text.find(preserve_marker)
-                if preserve_start_idx != -1:
-                    preserve_start_idx += ref_start_idx  # Adjust index relative to the entire text
-                    break
-
-            if preserve_start_idx != -1:
-                # Keep text up to the start of the preserve marker
-                cleaned_text = text[:ref_start_idx] + "\n" + text[preserve_start_idx:]
-            else:
-                # No preserve marker found; remove everything after references
-                cleaned_text = text[:ref_start_idx].strip()
-        else:
-            # If no references found, keep the text as it is
-            cleaned_text = text
-
-        doc.text = cleaned_text
-
-    return documents
\ No newline at end of file
+    return clean_data(documents, CleaningPipeline([ReferenceSectionStage()]))
@@ -1,5 +1,6 @@
 import os
 import sys
+import json
 import logging
 from llama_index.core.node_parser import (
     HierarchicalNodeParser,
@@ -15,14 +16,55 @@ from llama_index.core import (
     StorageContext,
     KnowledgeGraphIndex
 )
-from llama_index.graph_stores.neo4j import Neo4jGraphStore
 from llama_index.core.postprocessor import MetadataReplacementPostProcessor, SentenceTransformerRerank
+from llama_index.core.query_engine import RetrieverQueryEngine
+from upstream import get_neo4j_graph_store
+from embeddings import get_embed_model, describe_embed_model
+from index_registry import EMBEDDING_MANIFEST
 
 logging.basicConfig(stream=sys.stdout, level=logging.INFO)
 logging.getLogger().addHandler(logging.StreamHandler(stream=sys.stdout))
 
 
-def build_base_index(documents, save_dir_base_index="base_index"):
+def _manifest_path(save_dir):
+    # Indexes are persisted into a version directory, which holds the manifest (see index_registry.py)
+    return os.path.join(os.path.dirname(os.path.abspath(save_dir)), EMBEDDING_MANIFEST)
+
+
+def check_embedding_model(save_dir, embed_model):
+    """
+    Refuses to build an index into a version directory whose manifest records another
+    embedding model, before any embeddings are computed.
+
+    Parameters:
+    save_dir (str): Directory the index will be persisted to.
+    embed_model (BaseEmbedding): Embedding model the index will be built with.
+    """
+    try:
+        with open(_manifest_path(save_dir), 'r') as manifest:
+            recorded = json.load(manifest)
+    except FileNotFoundError:
+        return
+    model_name = describe_embed_model(embed_model)['model_name']
+    if recorded['model_name'] != model_name:
+        raise ValueError(f"{_manifest_path(save_dir)} records {recorded['model_name']}, but {save_dir} would be "
+                         f"embedded with {model_name}; build each model into its own version.")
+
+
+def record_embedding_model(save_dir, embed_model):
+    """
+    Records the embedding model of a freshly persisted index in the manifest of its version
+    directory, so the service accepts the version at startup.
+
+    Parameters:
+    save_dir (str): Directory the index was persisted to.
+    embed_model (BaseEmbedding): Embedding model the index was built with.
+    """
+    with open(_manifest_path(save_dir), 'w') as manifest:
+        json.dump(describe_embed_model(embed_model), manifest, indent=2)
+
+
+def build_base_index(documents, save_dir_base_index="base_index", embed_model=None):
     """
     Processes documents by splitting them into sentences, indexing them, and either saving the index
     to a directory or loading it if it already exists.
@@ -30,29 +72,34 @@ def build_base_index(documents, save_dir_base_index="base_index"):
     Parameters:
     documents (list): List of document strings to process.
     save_dir_base_index (str): Directory where the index is saved or to be saved.
+    embed_model (BaseEmbedding): Embedding model to use; defaults to get_embed_model().
 
     Returns:
     VectorStoreIndex: The base index created from the documents or loaded from the storage.
     """
+    embed_model = embed_model or get_embed_model()
+    check_embedding_model(save_dir_base_index, embed_model)
     # Splitting the documents into base nodes (sentences)
     base_nodes = SentenceSplitter().get_nodes_from_documents(documents)
 
     # Save the base index from the specified directory
-    base_index = VectorStoreIndex(base_nodes, show_progress=True)
+    base_index = VectorStoreIndex(base_nodes, embed_model=embed_model, show_progress=True)
     base_index.storage_context.persist(persist_dir=save_dir_base_index)
+    record_embedding_model(save_dir_base_index, embed_model)
 
     print("BASE INDEX SAVED!!!")
     return base_index
 
 
-def process_base_index(documents, save_dir_base_index):
+def process_base_index(documents, save_dir_base_index, embed_model=None):
+    embed_model = embed_model or get_embed_model()
     # Save or load the base index from the specified directory
     if not os.path.exists(save_dir_base_index):
-        base_index = build_base_index(documents, save_dir_base_index)
+        base_index = build_base_index(documents, save_dir_base_index, embed_model)
     else:
         # load base index from db
         base_index = load_index_from_storage(
-            StorageContext.from_defaults(persist_dir=save_dir_base_index), show_progress=True)
+            StorageContext.from_defaults(persist_dir=save_dir_base_index), embed_model=embed_model, show_progress=True)
         print("BASE INDEX LOADED SUCCESSFULLY!!!")
     return base_index
 
@@ -61,7 +108,10 @@ def build_sentence_window_index(
         documents,
         sentence_window_size=6,
         save_dir="sentence_index",
+        embed_model=None
 ):
+    embed_model = embed_model or get_embed_model()
+    check_embedding_model(save_dir, embed_model)
     # create the sentence window node parser w/ default settings
     node_parser = SentenceWindowNodeParser.from_defaults(
         window_size=sentence_window_size,
@@ -71,8 +121,9 @@ def build_sentence_window_index(
 
     sentence_nodes = node_parser.get_nodes_from_documents(documents)
 
-    sentence_index = VectorStoreIndex(sentence_nodes, show_progress=True)
+    sentence_index = VectorStoreIndex(sentence_nodes, embed_model=embed_model, show_progress=True)
     sentence_index.storage_context.persist(persist_dir=save_dir)
+    record_embedding_model(save_dir, embed_model)
     print("SENTENCE INDEX SAVED!!!")
     return sentence_index
 
@@ -81,40 +132,62 @@ def process_sentence_window_index(
         documents,
         sentence_window_size=6,
         save_dir="sentence_index",
+        embed_model=None
 ):
+    embed_model = embed_model or get_embed_model()
     # Save or load the sentence window index from the specified directory
     if not os.path.exists(save_dir):
-        sentence_index = build_sentence_window_index(documents, sentence_window_size, save_dir)
+        sentence_index = build_sentence_window_index(documents, sentence_window_size, save_dir, embed_model)
     else:
         # load sentence index from db
         sentence_index = load_index_from_storage(
-            StorageContext.from_defaults(persist_dir=save_dir), show_progress=True)
+            StorageContext.from_defaults(persist_dir=save_dir), embed_model=embed_model, show_progress=True)
         print("SENTENCE INDEX LOADED SUCCESSFULLY!!!")
     return sentence_index
 
 
+def load_sentence_reranker(rerank_top_n=2):
+    rerank = SentenceTransformerRerank(
+        top_n=rerank_top_n, model="BAAI/bge-reranker-base"
+    )
+    print("SENTENCE RERANK LOADED!!!")
+    return rerank
+
+
 def get_sentence_window_query_engine(
         sentence_index,
         llm,
         embed_model,
         prompt_template,
         similarity_top_k=6,
-        rerank_top_n=2
+        rerank_top_n=2,
+        context_packer=None,
+        rerank=None,
+        retriever=None
 ):
     # define postprocessors
     post_proc = MetadataReplacementPostProcessor(target_metadata_key="window")
-    rerank = SentenceTransformerRerank(
-        top_n=rerank_top_n, model="BAAI/bge-reranker-base"
-    )
-    print("SENTENCE RERANK LOADED!!!")
+    if rerank is None:
+        rerank = load_sentence_reranker(rerank_top_n)
+    node_postprocessors = [post_proc, rerank]
+    if context_packer is not None:
+        # pack after the window replacement so overlapping windows can be merged
+        node_postprocessors.append(context_packer)
+    if retriever is not None:
+        # e.g. a PartitionedRetriever over the sentence index
+        return RetrieverQueryEngine.from_args(
+            retriever, llm=llm, text_qa_template=prompt_template, node_postprocessors=node_postprocessors
+        )
     sentence_window_engine = sentence_index.as_query_engine(
         text_qa_template=prompt_template, similarity_top_k=similarity_top_k, embed_model=embed_model,
-        llm=llm, node_postprocessors=[post_proc, rerank]
+        llm=llm, node_postprocessors=node_postprocessors
     )
     return sentence_window_engine
 
 
-def build_auto_merging_retriever(documents, save_dir="auto_merge_index"):
+def build_auto_merging_retriever(documents, save_dir="auto_merge_index", embed_model=None):
+    embed_model = embed_model or get_embed_model()
+    check_embedding_model(save_dir, embed_model)
     node_parser = HierarchicalNodeParser.from_defaults(chunk_sizes=[1024, 512, 256])
     nodes = node_parser.get_nodes_from_documents(documents)
     print("Nodes:", len(nodes))
@@ -134,31 +207,32 @@ def build_auto_merging_retriever(documents, save_dir="auto_merge_index"):
 
     # save index into db
     auto_merging_index = VectorStoreIndex(
-        leaf_nodes, storage_context=storage_context, show_progress=True
+        leaf_nodes, storage_context=storage_context, embed_model=embed_model, show_progress=True
     )
     auto_merging_index.storage_context.persist(persist_dir=save_dir)
+    record_embedding_model(save_dir, embed_model)
     print("AUTO-MERGE INDEX SAVED!!!")
     return auto_merging_index
 
 
-def process_auto_merging_index(documents, save_dir):
+def process_auto_merging_index(documents, save_dir, embed_model=None):
+    embed_model = embed_model or get_embed_model()
     # Save or load the auto-merging index from the specified directory
     if not os.path.exists(save_dir):
-        auto_merging_index = build_auto_merging_retriever(documents, save_dir)
+        auto_merging_index = build_auto_merging_retriever(documents, save_dir, embed_model)
     else:
         # load sentence index from db
         auto_merging_index = load_index_from_storage(
-            StorageContext.from_defaults(persist_dir=save_dir), show_progress=True)
+            StorageContext.from_defaults(persist_dir=save_dir), embed_model=embed_model, show_progress=True)
         print("AUTO-MERGE INDEX LOADED SUCCESSFULLY!!!")
     return auto_merging_index
 
 
-def build_knowledge_graph(documents, save_dir="kg_index"):
-    # Neo4j Graph Store Setup
-    graph_store = Neo4jGraphStore(username="neo4j",
-                                  password="Ss123456$",
-                                  url="bolt://localhost:7687",  # "bolt://7.tcp.eu.ngrok.io:18000",
-                                  database="neo4j")
+def build_knowledge_graph(documents, save_dir="kg_index", embed_model=None):
+    embed_model = embed_model or get_embed_model()
+    check_embedding_model(save_dir, embed_model)
+    # Neo4j Graph Store Setup: pooled driver, credentials from NEO4J_URL/NEO4J_USERNAME/NEO4J_PASSWORD
+    graph_store = get_neo4j_graph_store()
 
     storage_context = StorageContext.from_defaults(graph_store=graph_store)
 
@@ -167,21 +241,24 @@ def build_knowledge_graph(documents, save_dir="kg_index"):
         storage_context=storage_context,
         max_triplets_per_chunk=10,
         include_embeddings=True,
+        embed_model=embed_model,
         show_progress=True
     )
     # save and load
     kg_index.storage_context.persist(persist_dir=save_dir)
+    record_embedding_model(save_dir, embed_model)
     print("KNOWLEDGE GRAPH INDEX SAVED!!!")
     return kg_index
 
 
-def process_knowledge_graph_index(documents, save_dir):
+def process_knowledge_graph_index(documents, save_dir, embed_model=None):
+    embed_model = embed_model or get_embed_model()
     # Save or load the auto-merging index from the specified directory
     if not os.path.exists(save_dir):
-        kg_index = build_knowledge_graph(documents, save_dir)
+        kg_index = build_knowledge_graph(documents, save_dir, embed_model)
     else:
         # load sentence index from db
         kg_index = load_index_from_storage(StorageContext.from_defaults(
-            persist_dir="kg_index"), show_progress=True)
+            persist_dir="kg_index"), embed_model=embed_model, show_progress=True)
         print("KNOWLEDGE GRAPH INDEX LOADED SUCCESSFULLY!!!")
     return kg_index
@@ -1,16 +1,37 @@
+import asyncio
+import gc
+import logging
 import os
+import threading
+import time
 import openai
 from dotenv import load_dotenv
-from llama_index.core import StorageContext, load_index_from_storage, Settings, PromptTemplate
+from llama_index.core import Settings, PromptTemplate
 from llama_index.llms.openai import OpenAI
-from llama_index.embeddings.openai import OpenAIEmbedding
 from llama_index.core.query_engine import RetrieverQueryEngine
 from llama_index.core.retrievers import AutoMergingRetriever
-from process_retriever_index import get_sentence_window_query_engine
+from llama_index.core.postprocessor import MetadataReplacementPostProcessor
+from llama_index.core.schema import QueryBundle
+from process_retriever_index import get_sentence_window_query_engine, load_sentence_reranker
+from context_packing import ContextPackingPostprocessor
+from adaptive_cascade import AdaptiveRetrieverCascade
+from index_registry import IndexRegistry, current_rss_mb
+from embeddings import OPENAI_EMBED_MODEL, get_embed_model, embed_queries, describe_embed_model
+from batch_retrieval import PrecomputedRetriever, batch_rerank, batch_vector_search
+from partitioned_retrieval import PaperPartitions, PartitionedRetriever
+from upstream import openai_client_kwargs
+
+RETRIEVER_TYPES = ('base', 'sentence_window', 'auto_merging', 'knowledge_graph')
+
+# similarity_top_k of the vector retrievers, shared by the query engines and the batched search
+VECTOR_TOP_K = {'base': 2, 'sentence_window': 6, 'auto_merging': 6}
+
+logger = logging.getLogger(__name__)
 
 
 class RAGEngine:
-    def __init__(self):
+    def __init__(self, context_token_budget=2048, storage_dir="storage", reload_poll_seconds=None,
+                 partition_routing=None):
         # Load environment variables from .env file
         load_dotenv()
 
@@ -21,49 +42,372 @@ class RAGEngine:
             raise ValueError("OPENAI_API_KEY environment variable not set.")
 
         # Set up LLM and embedding model
-        self.llm = OpenAI(model="gpt-4o-mini", temperature=0.1)
-        self.embed_model = OpenAIEmbedding(model="text-embedding-3-small")
+        # Pooled client with per-call deadlines, jittered retries and hedging (see upstream.py)
+        self.llm = OpenAI(model="gpt-4o-mini", temperature=0.1, **openai_client_kwargs('llm'))
+        # OpenAI by default; EMBED_BACKEND=local switches to batched CPU inference (see embeddings.py)
+        self.embed_model = get_embed_model()
 
         # Configure LlamaIndex settings
         Settings.llm = self.llm
         Settings.embed_model = self.embed_model
 
-        # Load indexes
-        self.base_index = load_index_from_storage(StorageContext.from_defaults(persist_dir="storage/base_index"))
-        self.sentence_index = load_index_from_storage(StorageContext.from_defaults(persist_dir="storage/sentence_index"))
-        self.auto_merging_index = load_index_from_storage(StorageContext.from_defaults(persist_dir="storage/auto_index"))
-        self.knowledge_graph_index = load_index_from_storage(StorageContext.from_defaults(persist_dir="storage/kg_index"))
-
         # Load prompt template
         with open("resources/text_qa_template.txt", 'r', encoding='utf-8') as file:
             self.prompt_template = PromptTemplate(file.read())
 
-    def get_query_engine(self, retriever_type):
+        # One context packer per retriever so token savings can be reported separately
+        self.context_packers = {
+            retriever_type: ContextPackingPostprocessor(token_budget=context_token_budget)
+            for retriever_type in RETRIEVER_TYPES
+        }
+
+        # Shared by every sentence window engine, so reloads and batches do not load the model again
+        self._reranker = None
+
+        # Opt-in: route vector retrieval to the partitions of the papers a question is about (see partitioned_retrieval.py)
+        if partition_routing is None:
+            partition_routing = os.getenv("PARTITION_ROUTING", "0") == "1"
+        self.partition_routing = partition_routing
+
+        # Load the current index version. Reloads swap self._bundle; requests keep the bundle they started with.
+        self.registry = IndexRegistry(storage_dir)
+        self._bundle = self.registry.load_bundle()
+        self._previous_version = None
+        self._reload_lock = threading.Lock()
+        self._check_embedding_manifest(self._bundle.version)
+        logger.info(f"Loaded index version {self._bundle.version}")
+
+        # 'auto' retriever: cheap base retrieval first, escalating only when confidence is low
+        self.cascade = AdaptiveRetrieverCascade(self)
+
+        # 0 turns the watcher off (the gunicorn master does so and starts one per worker instead)
+        if reload_poll_seconds is None:
+            reload_poll_seconds = os.getenv("INDEX_RELOAD_POLL_SECONDS", "0")
+        if float(reload_poll_seconds) > 0:
+            self.start_reload_watcher(float(reload_poll_seconds))
+
+    @property
+    def current_bundle(self):
+        return self._bundle
+
+    @property
+    def index_version(self):
+        return self._bundle.version
+
+    @property
+    def previous_index_version(self):
+        return self._previous_version
+
+    @property
+    def reranker(self):
+        if self._reranker is None:
+            self._reranker = load_sentence_reranker()
+        return self._reranker
+
+    @property
+    def base_index(self):
+        return self._bundle.base_index
+
+    @property
+    def sentence_index(self):
+        return self._bundle.sentence_index
+
+    @property
+    def auto_merging_index(self):
+        return self._bundle.auto_merging_index
+
+    @property
+    def knowledge_graph_index(self):
+        return self._bundle.knowledge_graph_index
+
+    def get_partitions(self, retriever_type, bundle=None):
+        """Per-paper partitions of a vector index, or None when its embeddings are not shared."""
+        bundle = bundle or self._bundle
+        if retriever_type not in bundle.embeddings:
+            return None
+        if retriever_type not in bundle.partitions:
+            bundle.partitions[retriever_type] = PaperPartitions(
+                bundle.indexes[retriever_type], bundle.embeddings[retriever_type])
+        return bundle.partitions[retriever_type]
+
+    def get_vector_retriever(self, retriever_type, bundle=None, papers=None, similarity_top_k=None):
+        """
+        Retriever over one of the vector indexes.
+
+        Searches only the `papers` partitions when given, the routed partitions when
+        partition routing is on, and the whole index otherwise.
+        """
+        bundle = bundle or self._bundle
+        similarity_top_k = similarity_top_k or VECTOR_TOP_K[retriever_type]
+        partitions = self.get_partitions(retriever_type, bundle)
+        if partitions is not None and (papers or self.partition_routing):
+            return PartitionedRetriever(partitions, self.embed_model, similarity_top_k, papers)
+        if papers:
+            raise ValueError("Filtering by papers needs indexes loaded with shared embeddings.")
+        return bundle.indexes[retriever_type].as_retriever(similarity_top_k=similarity_top_k)
+
+    def get_query_engine(self, retriever_type, bundle=None, papers=None):
+        # Query engines are built once per retriever type and bundle; the sentence window engine loads a reranker.
+        # Engines restricted to specific papers are built per request.
+        bundle = bundle or self._bundle
+        if papers:
+            return self._build_query_engine(retriever_type, bundle, papers)
+        if retriever_type not in bundle.query_engines:
+            bundle.query_engines[retriever_type] = self._build_query_engine(retriever_type, bundle)
+        return bundle.query_engines[retriever_type]
+
+    def _build_query_engine(self, retriever_type, bundle, papers=None):
         if retriever_type == 'base':
-            return self.base_index.as_query_engine()
+            return RetrieverQueryEngine.from_args(
+                self.get_vector_retriever('base', bundle, papers),
+                llm=self.llm,
+                node_postprocessors=[self.context_packers['base']]
+            )
         elif retriever_type == 'sentence_window':
             return get_sentence_window_query_engine(
-                self.sentence_index,
+                bundle.sentence_index,
                 self.llm,
                 self.embed_model,
-                self.prompt_template
+                self.prompt_template,
+                similarity_top_k=VECTOR_TOP_K['sentence_window'],
+                context_packer=self.context_packers['sentence_window'],
+                rerank=self.reranker,
+                retriever=self.get_vector_retriever('sentence_window', bundle, papers)
             )
         elif retriever_type == 'auto_merging':
-            auto_base_retriever = self.auto_merging_index.as_retriever(similarity_top_k=6)
+            auto_base_retriever = self.get_vector_retriever('auto_merging', bundle, papers)
             return RetrieverQueryEngine.from_args(
-                AutoMergingRetriever(auto_base_retriever, self.auto_merging_index.storage_context, verbose=True)
+                AutoMergingRetriever(auto_base_retriever, bundle.auto_merging_index.storage_context, verbose=True),
+                node_postprocessors=[self.context_packers['auto_merging']]
             )
         elif retriever_type == 'knowledge_graph':
-            return self.knowledge_graph_index.as_query_engine(
+            if papers:
+                raise ValueError("The knowledge_graph retriever does not support filtering by papers.")
+            return bundle.knowledge_graph_index.as_query_engine(
                 include_text=True,
                 response_mode="tree_summarize",
                 embedding_mode="hybrid",
-                similarity_top_k=5
+                similarity_top_k=5,
+                node_postprocessors=[self.context_packers['knowledge_graph']]
             )
         else:
             raise ValueError("Invalid retriever type")
 
-    async def ask_question(self, question: str, retriever_type: str) -> str:
-        query_engine = self.get_query_engine(retriever_type)
+    def _check_embedding_manifest(self, version):
+        """Refuse index versions embedded with a different model than the one queries use."""
+        manifest = self.registry.read_embedding_manifest(version)
+        expected = describe_embed_model(self.embed_model)
+        if manifest is None:
+            # Versions built before manifests were recorded use the OpenAI default
+            manifest = {'backend': "openai", 'model_name': OPENAI_EMBED_MODEL}
+            logger.info(f"Index version {version} does not record its embedding model; assuming {OPENAI_EMBED_MODEL}")
+        if manifest['model_name'] != expected['model_name']:
+            raise ValueError(f"Index version {version} was embedded with {manifest['model_name']}, "
+                             f"but queries use {expected['model_name']}. Re-embed it with reembed_indexes.py.")
+
+    def warm_up(self, bundle=None):
+        """Build every query engine up front, e.g. before a swap or before forking workers."""
+        for retriever_type in RETRIEVER_TYPES:
+            self.get_query_engine(retriever_type, bundle)
+            self.get_partitions(retriever_type, bundle)
+
+    async def ask_question(self, question: str, retriever_type: str, papers=None) -> str:
+        # Pin the bundle so a concurrent reload cannot change indexes halfway through this request
+        bundle = self._bundle
+        if retriever_type == 'auto':
+            response, _ = self.cascade.query(question, bundle, papers)
+            return str(response)
+        query_engine = self.get_query_engine(retriever_type, bundle, papers)
         response = query_engine.query(question)
         return str(response)
+
+    async def ask_batch(self, items, max_concurrency=8):
+        """
+        Answer many questions, yielding each result as soon as it is ready.
+
+        Retrieval work is shared across the batch: all questions are embedded in one call, each
+        vector index is searched once as a matrix product (masked to the selected papers), and
+        sentence window candidates are reranked in one cross-encoder pass. Answers are then
+        synthesized concurrently, at most `max_concurrency` at a time. Knowledge graph and
+        'auto' questions have no shared retrieval step and run as individual queries under the
+        same limit.
+
+        Parameters:
+        items (list): (question, retriever_type) or (question, retriever_type, papers) tuples.
+        max_concurrency (int): Maximum number of answers synthesized at once.
+
+        Yields:
+        dict: index (position in `items`), question, retriever_type, and answer or error.
+        """
+        items = [(item[0], item[1], item[2] if len(item) > 2 else None) for item in items]
+        bundle = self._bundle
+        try:
+            retrieved, errors = await asyncio.to_thread(self._batch_retrieve, items, bundle)
+        except Exception as e:
+            # The response is already streaming, so report the failure per item instead of raising
+            logger.error(f"Batched retrieval failed: {e}")
+            retrieved = {}
+            errors = {index: f"Batched retrieval failed: {e}"
+                      for index, (_, retriever_type, _) in enumerate(items)
+                      if self._is_batched(retriever_type, bundle)}
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def answer(index, question, retriever_type, papers):
+            result = {'index': index, 'question': question, 'retriever_type': retriever_type,
+                      'answer': None, 'error': errors.get(index)}
+            if result['error'] is not None:
+                return result
+            async with semaphore:
+                try:
+                    if index in retrieved:
+                        query_engine = self.get_query_engine(retriever_type, bundle)
+                        response = await query_engine.asynthesize(QueryBundle(question), retrieved[index])
+                    elif retriever_type == 'auto':
+                        response, _ = await asyncio.to_thread(self.cascade.query, question, bundle, papers)
+                    else:
+                        response = await self.get_query_engine(retriever_type, bundle, papers).aquery(question)
+                    result['answer'] = str(response)
+                except Exception as e:
+                    result['error'] = str(e)
+            return result
+
+        tasks = [asyncio.create_task(answer(index, *item)) for index, item in enumerate(items)]
+        for task in asyncio.as_completed(tasks):
+            yield await task
+
+    @staticmethod
+    def _is_batched(retriever_type, bundle):
+        return retriever_type in VECTOR_TOP_K and retriever_type in bundle.embeddings
+
+    def _batch_retrieve(self, items, bundle):
+        """
+        Batched retrieval for the vector retrievers.
+
+        Returns:
+        tuple: item index -> postprocessed nodes, and item index -> error message.
+        """
+        vector_items = [(index, question, retriever_type, papers)
+                        for index, (question, retriever_type, papers) in enumerate(items)
+                        if self._is_batched(retriever_type, bundle)]
+        if not vector_items:
+            return {}, {}
+
+        # One embedding call for every distinct question in the batch
+        questions = list(dict.fromkeys(item[1] for item in vector_items))
+        query_embeddings = dict(zip(questions, embed_queries(self.embed_model, questions)))
+
+        retrieved = {}
+        errors = {}
+        for retriever_type, top_k in VECTOR_TOP_K.items():
+            partitions = self.get_partitions(retriever_type, bundle)
+            group = []
+            allowed_rows = []
+            for index, question, item_type, papers in vector_items:
+                if item_type != retriever_type:
+                    continue
+                try:
+                    if papers:
+                        selected = partitions.resolve(papers)
+                    elif self.partition_routing:
+                        selected = partitions.route(question, query_embeddings[question])
+                    else:
+                        selected = None
+                except ValueError as ve:
+                    errors[index] = str(ve)
+                    continue
+                group.append((index, question))
+                allowed_rows.append(partitions.rows_for(selected) if selected else None)
+            if not group:
+                continue
+
+            index = bundle.indexes[retriever_type]
+            query_strs = [question for _, question in group]
+            node_lists = batch_vector_search(
+                index, bundle.embeddings[retriever_type], [query_embeddings[q] for q in query_strs], top_k,
+                allowed_rows=allowed_rows)
+
+            if retriever_type == 'sentence_window':
+                window_replacer = MetadataReplacementPostProcessor(target_metadata_key="window")
+                node_lists = [window_replacer.postprocess_nodes(nodes) for nodes in node_lists]
+                node_lists = batch_rerank(self.reranker, query_strs, node_lists)
+            elif retriever_type == 'auto_merging':
+                node_lists = [
+                    AutoMergingRetriever(PrecomputedRetriever({query_str: nodes}), index.storage_context)
+                    .retrieve(query_str)
+                    for query_str, nodes in zip(query_strs, node_lists)
+                ]
+
+            packer = self.context_packers[retriever_type]
+            for (item_index, question), nodes in zip(group, node_lists):
+                retrieved[item_index] = packer.postprocess_nodes(nodes, query_str=question)
+        return retrieved, errors
+
+    def reload(self, version=None):
+        """
+        Load an index version next to the one being served and swap it in.
+
+        The new bundle is fully loaded and its query engines are built before the swap, so
+        requests never wait on a load. In-flight requests finish on the old bundle, which is
+        freed once the last of them drops its reference.
+
+        Parameters:
+        version (str): Version to load. Defaults to the version CURRENT points at; an explicit
+            version is also published to CURRENT so other workers and restarts follow it.
+
+        Returns:
+        dict: Versions involved, load time and RSS before, during and after the overlap.
+        """
+        with self._reload_lock:
+            target = version or self.registry.current_version()
+            rss_before = current_rss_mb()
+            start = time.perf_counter()
+
+            self._check_embedding_manifest(target)
+            new_bundle = self.registry.load_bundle(target)
+            self.warm_up(new_bundle)
+            load_seconds = time.perf_counter() - start
+            rss_peak = current_rss_mb()
+
+            if version is not None:
+                self.registry.set_current(version)
+            old_bundle, self._bundle = self._bundle, new_bundle
+            if old_bundle.version != new_bundle.version:
+                self._previous_version = old_bundle.version
+            del old_bundle
+            gc.collect()
+            rss_after = current_rss_mb()
+
+            stats = {
+                'version': new_bundle.version,
+                'previous_version': self._previous_version,
+                'load_seconds': round(load_seconds, 3),
+                'rss_before_mb': round(rss_before, 1),
+                'rss_peak_mb': round(rss_peak, 1),
+                'rss_after_mb': round(rss_after, 1),
+            }
+            logger.info(f"Reloaded indexes: {stats}")
+            return stats
+
+    def rollback(self):
+        """Reload the version that was served before the last reload."""
+        if self._previous_version is None:
+            raise ValueError("No previous index version to roll back to.")
+        return self.reload(self._previous_version)
+
+    def start_reload_watcher(self, poll_seconds):
+        """
+        Poll the CURRENT pointer in a daemon thread and reload when it moves.
+
+        This is how every worker process picks up a version published by another worker
+        or by `python index_registry.py publish`.
+        """
+        def watch():
+            while True:
+                time.sleep(poll_seconds)
+                try:
+                    if self.registry.current_version() != self._bundle.version:
+                        self.reload()
+                except Exception as e:
+                    logger.error(f"Background index reload failed: {e}")
+
+        threading.Thread(target=watch, name="index-reload-watcher", daemon=True).start()
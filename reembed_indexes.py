@@ -0,0 +1,118 @@
+"""
+Re-embeds an existing index version with another embedding model into a new version.
+
+Nodes, docstores and the knowledge graph are copied unchanged; only the vectors are
+recomputed, in batches, so no LLM calls are made and node ids stay identical (which is
+what lets benchmarks compare retrieval between the two versions).
+
+Usage (from the project root):
+    EMBED_BACKEND=local EMBED_QUANTIZE=int8 python reembed_indexes.py --publish
+"""
+import argparse
+import os
+import shutil
+import time
+from llama_index.core.schema import MetadataMode
+from llama_index.core.storage.docstore import SimpleDocumentStore
+from llama_index.core.storage.index_store import SimpleIndexStore
+from llama_index.core.vector_stores import SimpleVectorStore
+from embeddings import get_embed_model, describe_embed_model
+from index_registry import IndexRegistry, INDEX_DIRS, VECTOR_INDEX_TYPES
+from shared_indexes import EMBEDDINGS_FILE, EMBEDDING_IDS_FILE, VECTOR_STORE_FILE
+
+DOCSTORE_FILE = "docstore.json"
+INDEX_STORE_FILE = "index_store.json"
+
+
+def reembed_vector_index(persist_dir, embed_model):
+    """
+    Replace the embeddings of a persisted vector index in place.
+
+    Returns:
+    int: Number of nodes re-embedded.
+    """
+    vector_store = SimpleVectorStore.from_persist_path(os.path.join(persist_dir, VECTOR_STORE_FILE))
+    docstore = SimpleDocumentStore.from_persist_path(os.path.join(persist_dir, DOCSTORE_FILE))
+
+    node_ids = list(vector_store.data.embedding_dict.keys())
+    # Same text VectorStoreIndex embeds at build time
+    texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in docstore.get_nodes(node_ids)]
+    vectors = embed_model.get_text_embedding_batch(texts, show_progress=True)
+    vector_store.data.embedding_dict = dict(zip(node_ids, vectors))
+    vector_store.persist(os.path.join(persist_dir, VECTOR_STORE_FILE))
+
+    # The memory-mapped copy belongs to the old embeddings
+    for stale_file in (EMBEDDINGS_FILE, EMBEDDING_IDS_FILE):
+        if os.path.exists(os.path.join(persist_dir, stale_file)):
+            os.remove(os.path.join(persist_dir, stale_file))
+    return len(node_ids)
+
+
+def reembed_knowledge_graph(persist_dir, embed_model):
+    """
+    Replace the triplet embeddings of a persisted knowledge graph index in place.
+
+    Returns:
+    int: Number of triplets re-embedded.
+    """
+    index_store_path = os.path.join(persist_dir, INDEX_STORE_FILE)
+    index_store = SimpleIndexStore.from_persist_path(index_store_path)
+    count = 0
+    for index_struct in index_store.index_structs():
+        triplets = list(index_struct.embedding_dict.keys())
+        if not triplets:
+            continue
+        vectors = embed_model.get_text_embedding_batch(triplets, show_progress=True)
+        index_struct.embedding_dict = dict(zip(triplets, vectors))
+        index_store.add_index_struct(index_struct)
+        count += len(triplets)
+    index_store.persist(index_store_path)
+    return count
+
+
+def reembed_indexes(registry, embed_model, source_version=None):
+    """
+    Copy `source_version` (default: current) into a new version and re-embed it.
+
+    Returns:
+    str: Name of the new version.
+    """
+    source_version = source_version or registry.current_version()
+    target_version = registry.new_version()
+    print(f"Re-embedding {source_version} into {target_version} with {describe_embed_model(embed_model)}")
+
+    for retriever_type in INDEX_DIRS:
+        source_dir = registry.index_dir(source_version, retriever_type)
+        target_dir = registry.index_dir(target_version, retriever_type)
+        shutil.copytree(source_dir, target_dir)
+
+        start = time.perf_counter()
+        if retriever_type in VECTOR_INDEX_TYPES:
+            count = reembed_vector_index(target_dir, embed_model)
+        else:
+            count = reembed_knowledge_graph(target_dir, embed_model)
+        elapsed = time.perf_counter() - start
+        print(f"{INDEX_DIRS[retriever_type]}: {count} embeddings in {elapsed:.1f}s "
+              f"({count / elapsed if elapsed else 0:.0f}/s)")
+
+    registry.write_embedding_manifest(target_version, describe_embed_model(embed_model))
+    return target_version
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--root', default="storage")
+    parser.add_argument('--source-version', default=None, help="Version to copy; defaults to CURRENT.")
+    parser.add_argument('--backend', default=None, help="Overrides EMBED_BACKEND.")
+    parser.add_argument('--model-name', default=None)
+    parser.add_argument('--publish', action='store_true', help="Point CURRENT at the new version when done.")
+    args = parser.parse_args()
+
+    index_registry = IndexRegistry(args.root)
+    new_version = reembed_indexes(
+        index_registry, get_embed_model(backend=args.backend, model_name=args.model_name), args.source_version)
+    if args.publish:
+        index_registry.set_current(new_version)
+        print(f"CURRENT -> {new_version}")
+    else:
+        print(f"Publish with: python index_registry.py publish {new_version}")
@@ -0,0 +1,176 @@
+import glob
+import os
+import uuid
+from datetime import datetime, timezone
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+QUESTIONS_TABLE = "questions"
+RUNS_TABLE = "runs"
+
+# Metric scores are stored as metric_<name> columns, e.g. metric_retrieval_precision
+METRIC_PREFIX = "metric_"
+
+
+def metric_columns(df):
+    return [column for column in df.columns if column.startswith(METRIC_PREFIX)]
+
+
+class ResultsStore:
+    def __init__(self, root="evaluation_results"):
+        """
+        Append-only columnar store of evaluation runs.
+
+        Every appended run is written as a new Parquet part file per table, so appending never
+        rewrites earlier results and an interrupted evaluation keeps the runs it finished:
+            <root>/questions/   one row per question: experiment, run, question, answers,
+                                latency_seconds and one metric_<name> column per metric
+            <root>/runs/        one row per run: experiment, run, evaluator and the overall
+                                metric_<name> scores reported by Tonic Validate
+        Runs scored with different metrics can share a store; missing metrics read as NaN.
+
+        Parameters:
+        root (str): Store directory.
+        """
+        self.root = root
+
+    def table_dir(self, table):
+        return os.path.join(self.root, table)
+
+    def part_files(self, table):
+        return sorted(glob.glob(os.path.join(self.table_dir(table), "*.parquet")))
+
+    def _write_part(self, table, arrow_table):
+        os.makedirs(self.table_dir(table), exist_ok=True)
+        name = f"part-{datetime.now(timezone.utc):%Y%m%dT%H%M%S%f}-{uuid.uuid4().hex[:8]}.parquet"
+        path = os.path.join(self.table_dir(table), name)
+        # Write under a temporary name so readers never see a partial file
+        pq.write_table(arrow_table, path + ".tmp")
+        os.replace(path + ".tmp", path)
+        return path
+
+    def append_run(self, experiment, run, run_number, latencies=None, metadata=None):
+        """
+        Append one Tonic Validate run.
+
+        Parameters:
+        experiment (str): Experiment (retriever configuration) name.
+        run (Run): Scored run returned by ValidateScorer.score.
+        run_number (int): Position of the run within its experiment.
+        latencies (dict): Question -> seconds taken to answer it (see utils.make_get_llama_response).
+        metadata (dict): Extra run-level columns, e.g. {'top_k': 6}.
+
+        Returns:
+        str: The run id.
+        """
+        run_id = str(run.id) if getattr(run, 'id', None) else uuid.uuid4().hex
+        recorded_at = pd.Timestamp.now(tz="UTC")
+        latencies = latencies or {}
+        metadata = metadata or {}
+        identity = {'experiment': experiment, 'run_id': run_id, 'run_number': run_number,
+                    'recorded_at': recorded_at, **metadata}
+
+        questions = pd.DataFrame({
+            'question_index': range(len(run.run_data)),
+            'question': [data.reference_question for data in run.run_data],
+            'reference_answer': [data.reference_answer for data in run.run_data],
+            'llm_answer': [data.llm_answer for data in run.run_data],
+            'context_count': [len(data.llm_context or []) for data in run.run_data],
+            'latency_seconds': [latencies.get(data.reference_question) for data in run.run_data],
+        }, dtype=object)
+        scores = pd.DataFrame([data.scores for data in run.run_data], index=questions.index)
+        questions = pd.concat([questions, scores.add_prefix(METRIC_PREFIX)], axis=1)
+        self.append_questions(questions.assign(**identity))
+
+        overall = {METRIC_PREFIX + name: score for name, score in run.overall_scores.items()}
+        self.append_runs(pd.DataFrame([{**identity, 'llm_evaluator': run.llm_evaluator,
+                                        'question_count': len(run.run_data), **overall}]))
+        return run_id
+
+    def append_questions(self, df):
+        return self._write_part(QUESTIONS_TABLE, _to_arrow(df))
+
+    def append_runs(self, df):
+        return self._write_part(RUNS_TABLE, _to_arrow(df))
+
+    def read(self, table, columns=None, experiments=None):
+        """
+        Read a table across all part files.
+
+        Parameters:
+        table (str): QUESTIONS_TABLE or RUNS_TABLE.
+        columns (list): Only read these columns (Parquet is columnar, so the rest is skipped).
+        experiments (list): Only read rows of these experiments.
+
+        Returns:
+        DataFrame: The table; empty when nothing was written yet.
+        """
+        table = self._read_arrow(table, columns, experiments)
+        return table.to_pandas() if table is not None else pd.DataFrame()
+
+    def _read_arrow(self, table, columns=None, experiments=None):
+        files = self.part_files(table)
+        if not files:
+            return None
+        filters = [('experiment', 'in', list(experiments))] if experiments is not None else None
+        parts = []
+        for path in files:
+            names = pq.read_schema(path).names
+            parts.append(pq.read_table(path, columns=[c for c in columns if c in names] if columns else None,
+                                       filters=filters))
+        # Parts written with other metrics get the missing columns as nulls
+        result = pa.concat_tables(parts, promote_options="default")
+        if columns:
+            result = result.select([c for c in columns if c in result.column_names])
+        return result
+
+    def questions(self, columns=None, experiments=None):
+        return self.read(QUESTIONS_TABLE, columns, experiments)
+
+    def runs(self, columns=None, experiments=None):
+        return self.read(RUNS_TABLE, columns, experiments)
+
+    def run_scores(self, experiments=None):
+        """
+        Per-run mean of every metric and of latency_seconds, computed from the question rows.
+
+        Returns:
+        DataFrame: One row per run: experiment, run_id, run_number and the mean columns.
+        """
+        questions = self.questions(experiments=experiments)
+        if questions.empty:
+            return questions
+        value_columns = metric_columns(questions) + ['latency_seconds']
+        return (questions.groupby(['experiment', 'run_id', 'run_number'], sort=False)[value_columns]
+                .mean().reset_index())
+
+    def compact(self, table):
+        """
+        Merge a table's part files into one, which keeps reads fast after many appends.
+        Run it while no evaluation is appending to the store.
+
+        Returns:
+        int: Number of part files merged.
+        """
+        files = self.part_files(table)
+        if len(files) < 2:
+            return 0
+        self._write_part(table, self._read_arrow(table))
+        for path in files:
+            os.remove(path)
+        return len(files)
+
+
+def _to_arrow(df):
+    """Fix column types (metrics and latency as float64 even when all missing), so part files unify."""
+    float_columns = metric_columns(df) + (['latency_seconds'] if 'latency_seconds' in df.columns else [])
+    df = df.copy()
+    df[float_columns] = df[float_columns].astype('float64')
+    for column in ('question', 'reference_answer', 'llm_answer'):
+        if column in df.columns:
+            df[column] = df[column].astype('string')
+    for column in ('question_index', 'context_count', 'run_number'):
+        if column in df.columns:
+            df[column] = df[column].astype('int64')
+    return pa.Table.from_pandas(df, preserve_index=False)
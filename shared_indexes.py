@@ -0,0 +1,203 @@
+import fcntl
+import gc
+import json
+import os
+import tempfile
+import numpy as np
+from typing import Any
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.vector_stores import SimpleVectorStore
+from llama_index.core.vector_stores.types import VectorStoreQuery, VectorStoreQueryMode, VectorStoreQueryResult
+
+EMBEDDINGS_FILE = "embeddings.npy"
+EMBEDDING_IDS_FILE = "embedding_ids.json"
+EMBEDDINGS_LOCK_FILE = "embeddings.lock"
+VECTOR_STORE_FILE = "default__vector_store.json"
+
+
+class EmbeddingMatrix:
+    def __init__(self, node_ids, matrix):
+        """
+        Node embeddings of one vector index as a single float32 matrix.
+
+        The matrix is normally a read-only memory map, so every process that opens the same
+        file shares its pages through the OS page cache instead of holding private copies of
+        millions of Python floats.
+
+        Parameters:
+        node_ids (list): Node id of each matrix row.
+        matrix (np.ndarray): Embeddings, one row per node.
+        """
+        self.node_ids = node_ids
+        self.matrix = matrix
+        self.norms = np.linalg.norm(matrix, axis=1)
+        self.norms[self.norms == 0] = 1.0
+        self.row_of = {node_id: row for row, node_id in enumerate(node_ids)}
+
+    def __len__(self):
+        return len(self.node_ids)
+
+    def cosine_scores(self, query_embeddings, rows=None):
+        """
+        Cosine similarity of each query against every (or the selected) row.
+
+        Parameters:
+        query_embeddings (np.ndarray): Shape (n_queries, dim) or (dim,).
+        rows (np.ndarray): Optional row subset to score.
+
+        Returns:
+        np.ndarray: Shape (n_queries, n_rows).
+        """
+        queries = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        query_norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        query_norms[query_norms == 0] = 1.0
+        matrix, norms = (self.matrix, self.norms) if rows is None else (self.matrix[rows], self.norms[rows])
+        return (queries @ matrix.T) / (query_norms * norms)
+
+    def top_k(self, query_embeddings, k, rows=None):
+        """
+        Top-k rows per query, best first.
+
+        Returns:
+        list: One (node_ids, scores) pair per query.
+        """
+        return self.top_k_from_scores(self.cosine_scores(query_embeddings, rows), k, rows)
+
+    def top_k_from_scores(self, scores, k, rows=None):
+        """
+        Top-k of an already computed score matrix; rows scored -inf (masked out) are never returned.
+
+        Returns:
+        list: One (node_ids, scores) pair per query.
+        """
+        k = min(k, scores.shape[1])
+        if k == 0:
+            return [([], []) for _ in range(scores.shape[0])]
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for query_scores, query_candidates in zip(scores, candidates):
+            order = query_candidates[np.argsort(-query_scores[query_candidates])]
+            order = order[np.isfinite(query_scores[order])]
+            row_ids = order if rows is None else np.asarray(rows)[order]
+            results.append(([self.node_ids[r] for r in row_ids], query_scores[order].tolist()))
+        return results
+
+    @classmethod
+    def from_persist_dir(cls, persist_dir, embedding_dict=None):
+        """
+        Memory-map the embeddings saved next to a persisted vector index.
+
+        The .npy file is (re)written from the vector store JSON when it is missing or older,
+        so the first process to load a version pays the conversion once.
+        """
+        matrix_path = os.path.join(persist_dir, EMBEDDINGS_FILE)
+        ids_path = os.path.join(persist_dir, EMBEDDING_IDS_FILE)
+        store_path = os.path.join(persist_dir, VECTOR_STORE_FILE)
+
+        def stale():
+            return (not os.path.exists(matrix_path) or not os.path.exists(ids_path)
+                    or os.path.getmtime(matrix_path) < os.path.getmtime(store_path))
+
+        if stale():
+            # Workers reloading a newly published version get here at about the same time: the
+            # first one to take the lock converts, the others find the files fresh afterwards
+            with open(os.path.join(persist_dir, EMBEDDINGS_LOCK_FILE), 'a') as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                if stale():
+                    cls._write_matrix(persist_dir, store_path, matrix_path, ids_path, embedding_dict)
+
+        with open(ids_path, 'r') as file:
+            node_ids = json.load(file)
+        return cls(node_ids, np.load(matrix_path, mmap_mode='r'))
+
+    @staticmethod
+    def _write_matrix(persist_dir, store_path, matrix_path, ids_path, embedding_dict=None):
+        if embedding_dict is None:
+            embedding_dict = SimpleVectorStore.from_persist_path(store_path).data.embedding_dict
+        node_ids = list(embedding_dict.keys())
+        matrix = np.asarray([embedding_dict[node_id] for node_id in node_ids], dtype=np.float32)
+        # Write to files of this process and rename, so no process maps a partially written file
+        for path, write in ((ids_path, lambda file: file.write(json.dumps(node_ids).encode())),
+                            (matrix_path, lambda file: np.save(file, matrix))):
+            fd, tmp_path = tempfile.mkstemp(dir=persist_dir, prefix=os.path.basename(path) + ".", suffix=".tmp")
+            try:
+                with os.fdopen(fd, 'wb') as file:
+                    write(file)
+                os.chmod(tmp_path, 0o644)
+                os.replace(tmp_path, path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+
+
+class MatrixVectorStore(SimpleVectorStore):
+    """
+    SimpleVectorStore that answers plain similarity queries from an EmbeddingMatrix.
+
+    Default-mode queries without filters become one matrix-vector product over the shared
+    memory map. Anything else (filters, MMR, learner modes) falls back to SimpleVectorStore,
+    which still works because embedding_dict now maps node ids to rows of the same matrix.
+    Serving only: the store is not meant to be persisted again.
+    """
+
+    _embeddings: Any = PrivateAttr()
+
+    def __init__(self, embeddings: EmbeddingMatrix, **kwargs):
+        super().__init__(**kwargs)
+        self._embeddings = embeddings
+        self.data.embedding_dict = {
+            node_id: embeddings.matrix[row] for row, node_id in enumerate(embeddings.node_ids)
+        }
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "MatrixVectorStore"
+
+    @property
+    def embeddings(self) -> EmbeddingMatrix:
+        return self._embeddings
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        if (query.mode != VectorStoreQueryMode.DEFAULT or query.filters is not None
+                or query.doc_ids or query.node_ids or query.query_embedding is None):
+            return super().query(query, **kwargs)
+        [(ids, scores)] = self._embeddings.top_k(query.query_embedding, query.similarity_top_k)
+        return VectorStoreQueryResult(similarities=scores, ids=ids)
+
+
+def share_vector_index(index, persist_dir):
+    """
+    Swap a loaded VectorStoreIndex onto a memory-mapped MatrixVectorStore.
+
+    Parameters:
+    index (VectorStoreIndex): Index loaded from `persist_dir`.
+    persist_dir (str): Directory the index was persisted to.
+
+    Returns:
+    EmbeddingMatrix: The shared embeddings now backing the index.
+    """
+    vector_store = index.vector_store
+    embeddings = EmbeddingMatrix.from_persist_dir(persist_dir, vector_store.data.embedding_dict)
+    shared_store = MatrixVectorStore(
+        embeddings,
+        data=type(vector_store.data)(
+            text_id_to_ref_doc_id=vector_store.data.text_id_to_ref_doc_id,
+            metadata_dict=vector_store.data.metadata_dict
+        )
+    )
+    index._vector_store = shared_store
+    index.storage_context.vector_stores["default"] = shared_store
+    return embeddings
+
+
+def freeze_loaded_objects():
+    """
+    Move everything loaded so far into the GC's permanent generation.
+
+    Call in the parent process after the indexes are loaded and before forking workers:
+    the collector then never walks (and so never writes to) the shared objects, which keeps
+    their pages copy-on-write shared between workers.
+    """
+    gc.collect()
+    gc.freeze()
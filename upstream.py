@@ -0,0 +1,682 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import httpx
+import neo4j
+import numpy as np
+from llama_index.embeddings.openai import OpenAIEmbedding
+from llama_index.embeddings.openai.base import aget_embedding, aget_embeddings, get_embedding, get_embeddings
+from llama_index.graph_stores.neo4j import Neo4jGraphStore
+
+logger = logging.getLogger(__name__)
+
+# Per-upstream defaults, each overridable with UPSTREAM_<NAME>_TIMEOUT / _MAX_RETRIES / _HEDGE_PERCENTILE
+# / _HEDGE_BUDGET. timeout is the deadline for a whole call, retries and hedges included.
+# Hedging is off for the LLM: a duplicate completion is paid for in full.
+UPSTREAM_DEFAULTS = {
+    'llm': {'timeout': 30.0, 'max_retries': 2, 'hedge_percentile': None},
+    'embeddings': {'timeout': 10.0, 'max_retries': 3, 'hedge_percentile': 95.0},
+    'neo4j': {'timeout': 10.0, 'max_retries': 2, 'hedge_percentile': None},
+}
+
+# Statuses worth another attempt: rate limits, overload and gateway errors
+RETRYABLE_STATUS = frozenset({408, 409, 429, 500, 502, 503, 504})
+
+NEO4J_RETRYABLE_ERRORS = (
+    neo4j.exceptions.ServiceUnavailable,
+    neo4j.exceptions.SessionExpired,
+    neo4j.exceptions.TransientError,
+)
+
+
+class UpstreamDeadlineExceeded(TimeoutError):
+    """The call did not succeed within its deadline, retries and hedges included."""
+
+
+class LatencyHistogram:
+    """
+    Latency histogram with log-spaced buckets from 1 ms to 2 minutes.
+
+    Counts are halved every `window` samples, so percentiles follow recent behaviour
+    (e.g. a slower model deployment) instead of the whole process lifetime.
+    """
+
+    BOUNDS = np.geomspace(0.001, 120.0, num=64)
+
+    def __init__(self, window=2048):
+        self.window = window
+        self._counts = np.zeros(len(self.BOUNDS) + 1)
+        self._since_decay = 0
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._counts[np.searchsorted(self.BOUNDS, seconds)] += 1
+            self._since_decay += 1
+            if self._since_decay >= self.window:
+                self._counts /= 2
+                self._since_decay = 0
+
+    @property
+    def count(self):
+        return float(self._counts.sum())
+
+    def percentile(self, q):
+        """Upper bound of the bucket holding the q-th percentile, or None without samples."""
+        with self._lock:
+            total = self._counts.sum()
+            if total == 0:
+                return None
+            bucket = int(np.searchsorted(np.cumsum(self._counts), total * q / 100.0))
+        return float(self.BOUNDS[min(bucket, len(self.BOUNDS) - 1)])
+
+
+class HedgeBudget:
+    """
+    Token bucket limiting hedges to a share of calls.
+
+    Every call adds `ratio` tokens (up to `burst`) and every hedge takes one, so over time
+    at most about `ratio` of calls are hedged, however slow the upstream gets. Without it,
+    an overloaded upstream makes most calls slower than the percentile, and hedging them
+    all doubles the load exactly when it hurts most.
+    """
+
+    def __init__(self, ratio=0.05, burst=10.0):
+        self.ratio = ratio
+        self.burst = burst
+        self._tokens = burst if ratio > 0 else 0.0
+        self._lock = threading.Lock()
+
+    def add_call(self):
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + self.ratio)
+
+    def available(self):
+        return self._tokens >= 1
+
+    def take(self):
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class UpstreamPolicy:
+    def __init__(self, name, timeout=30.0, max_retries=2, hedge_percentile=None, hedge_budget=0.05,
+                 backoff_base=0.2, backoff_max=2.0, hedge_min_samples=20, hedge_min_delay=0.05):
+        """
+        Deadline, retry and hedging rules for calls to one upstream service, with the latency
+        histogram and counters that drive and report them.
+
+        Parameters:
+        name (str): Upstream name, used in logs and reports.
+        timeout (float): Deadline in seconds for a whole call, retries and hedges included.
+        max_retries (int): Retries after the first attempt.
+        hedge_percentile (float): Send a duplicate attempt when the first one is slower than
+            this percentile of recent latencies; None disables hedging.
+        hedge_budget (float): Largest share of calls that may be hedged (see HedgeBudget).
+        backoff_base (float): Backoff before the first retry; doubles per retry, full jitter.
+        backoff_max (float): Longest backoff between retries.
+        hedge_min_samples (int): Latencies recorded before hedging starts.
+        hedge_min_delay (float): Never hedge sooner than this many seconds.
+        """
+        self.name = name
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.hedge_percentile = hedge_percentile
+        self.hedge_budget = HedgeBudget(hedge_budget)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_min_delay = hedge_min_delay
+        self.histogram = LatencyHistogram()
+        self.counters = {'calls': 0, 'attempts': 0, 'retries': 0, 'hedges': 0, 'hedge_wins': 0,
+                         'hedges_over_budget': 0, 'deadline_exceeded': 0, 'failures': 0}
+        self._counter_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, name):
+        settings = dict(UPSTREAM_DEFAULTS.get(name, {}))
+        prefix = f"UPSTREAM_{name.upper()}_"
+        if os.getenv(prefix + "TIMEOUT"):
+            settings['timeout'] = float(os.getenv(prefix + "TIMEOUT"))
+        if os.getenv(prefix + "MAX_RETRIES"):
+            settings['max_retries'] = int(os.getenv(prefix + "MAX_RETRIES"))
+        if os.getenv(prefix + "HEDGE_PERCENTILE") is not None:
+            # "0" or an empty value turns hedging off
+            hedge_percentile = float(os.getenv(prefix + "HEDGE_PERCENTILE") or 0)
+            settings['hedge_percentile'] = hedge_percentile or None
+        if os.getenv(prefix + "HEDGE_BUDGET"):
+            settings['hedge_budget'] = float(os.getenv(prefix + "HEDGE_BUDGET"))
+        return cls(name, **settings)
+
+    def count(self, counter, amount=1):
+        with self._counter_lock:
+            self.counters[counter] += amount
+
+    def backoff(self, attempt, retry_after=None):
+        """Full-jitter exponential backoff, honouring a server's Retry-After within backoff_max."""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.backoff_max))
+        return delay
+
+    def hedge_delay(self):
+        """Seconds to wait on an attempt before hedging it, or None when hedging is off."""
+        if self.hedge_percentile is None or self.histogram.count < self.hedge_min_samples:
+            return None
+        return max(self.hedge_min_delay, self.histogram.percentile(self.hedge_percentile))
+
+    def _may_hedge(self, timeout):
+        """Hedge delay for an attempt with `timeout` seconds left, or None when it cannot be hedged."""
+        hedge_delay = self.hedge_delay()
+        if hedge_delay is None or hedge_delay >= timeout:
+            return None
+        if not self.hedge_budget.available():
+            return None
+        return hedge_delay
+
+    def _take_hedge(self):
+        """Spend a budget token on a hedge; counts the hedges the budget refused."""
+        if self.hedge_budget.take():
+            self.count('hedges')
+            return True
+        self.count('hedges_over_budget')
+        return False
+
+    def report(self):
+        """Latency percentiles, counters and the timeout the histogram suggests."""
+        percentiles = {f"p{q}": self.histogram.percentile(q) for q in (50, 90, 95, 99)}
+        p99 = percentiles['p99']
+        return {
+            'timeout': self.timeout,
+            'max_retries': self.max_retries,
+            'hedge_percentile': self.hedge_percentile,
+            'hedge_budget': self.hedge_budget.ratio,
+            'hedge_delay': self.hedge_delay(),
+            # Room for one slow attempt plus a retry; a much larger configured timeout only adds tail latency
+            'suggested_timeout': round(3 * p99, 3) if p99 is not None else None,
+            'samples': round(self.histogram.count),
+            **percentiles,
+            **self.counters,
+        }
+
+    def call(self, attempt, is_failure=None, retry_on=(), discard=None, hedge=True):
+        """
+        Run `attempt(timeout)` under this policy: within the deadline, retried with jittered
+        backoff, and hedged with a concurrent duplicate when it is slower than usual.
+
+        Parameters:
+        attempt (callable): Makes one attempt given the seconds left; returns a result or raises.
+        is_failure (callable): Marks results that should be retried (e.g. HTTP 503 responses).
+        retry_on (tuple): Exception types that should be retried.
+        discard (callable): Releases a result that is not returned (e.g. closes a response).
+        hedge (bool): Whether this call may be hedged at all.
+
+        Returns:
+        The first successful result, or the last failed result once retries run out.
+        """
+        self.count('calls')
+        self.hedge_budget.add_call()
+        deadline = time.monotonic() + self.timeout
+        for retry in range(self.max_retries + 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                if hedge:
+                    result = self._hedged(attempt, remaining, is_failure, retry_on, discard)
+                else:
+                    result = self._timed(attempt, remaining)
+                failed = is_failure is not None and is_failure(result)
+                error = None
+            except retry_on as e:
+                result, failed, error = None, True, e
+            if not failed:
+                return result
+
+            delay = self.backoff(retry, _retry_after(result))
+            if retry == self.max_retries or time.monotonic() + delay >= deadline:
+                return self._give_up(result, error)
+            if result is not None and discard is not None:
+                discard(result)
+            self.count('retries')
+            time.sleep(delay)
+        self.count('deadline_exceeded')
+        raise UpstreamDeadlineExceeded(f"{self.name}: no response within {self.timeout}s")
+
+    def _give_up(self, result, error):
+        self.count('failures')
+        if error is not None:
+            raise error
+        return result
+
+    def _timed(self, attempt, timeout):
+        self.count('attempts')
+        start = time.monotonic()
+        result = attempt(timeout)
+        self.histogram.record(time.monotonic() - start)
+        return result
+
+    def _hedged(self, attempt, timeout, is_failure, retry_on, discard):
+        hedge_delay = self._may_hedge(timeout)
+        if hedge_delay is None:
+            # Nothing to race against: run on the caller's thread
+            return self._timed(attempt, timeout)
+
+        # The caller has to stay free to take a hedge's answer, so the first attempt runs on a
+        # pool thread. The hedge delay is counted from when it starts: time spent queued for a
+        # thread says nothing about the upstream and must not trigger hedges. Queueing does use
+        # up the deadline, though, so every attempt only gets the time left until it.
+        deadline = time.monotonic() + timeout
+        started = []
+
+        def first_attempt():
+            started.append(time.monotonic())
+            remaining = deadline - started[0]
+            if remaining <= 0:
+                self.count('deadline_exceeded')
+                raise UpstreamDeadlineExceeded(f"{self.name}: deadline passed while queued for a connection slot")
+            return self._timed(attempt, remaining)
+
+        primary = _attempt_pool().submit(first_attempt)
+        hedge_at = time.monotonic() + hedge_delay
+        while not wait([primary], timeout=max(0.0, hedge_at - time.monotonic())).done:
+            if started and time.monotonic() >= started[0] + hedge_delay:
+                break
+            # Still queued, or started late: wait for the delay counted from its start
+            hedge_at = (started[0] if started else time.monotonic()) + hedge_delay
+        remaining = deadline - time.monotonic()
+        if primary.done() or remaining <= 0 or not self._take_hedge():
+            return primary.result()
+        hedge = _hedge_pool().submit(self._timed, attempt, remaining)
+
+        pending = {primary, hedge}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                error = future.exception()
+                if error is not None and not isinstance(error, retry_on):
+                    raise error
+                if error is None and not (is_failure is not None and is_failure(future.result())):
+                    if future is hedge:
+                        self.count('hedge_wins')
+                    if discard is not None:
+                        # The loser keeps running; release whatever it returns
+                        for other in pending:
+                            other.add_done_callback(lambda f: f.exception() or discard(f.result()))
+                    return future.result()
+                if pending and error is None and discard is not None:
+                    discard(future.result())
+        # Both attempts failed; report the one that finished last
+        return future.result()
+
+    async def acall(self, attempt, is_failure=None, retry_on=(), discard=None, hedge=True):
+        """Async version of `call`; `attempt(timeout)` and `discard(result)` are coroutines."""
+        self.count('calls')
+        self.hedge_budget.add_call()
+        deadline = time.monotonic() + self.timeout
+        for retry in range(self.max_retries + 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                if hedge:
+                    result = await self._ahedged(attempt, remaining, is_failure, retry_on, discard)
+                else:
+                    result = await self._atimed(attempt, remaining)
+                failed = is_failure is not None and is_failure(result)
+                error = None
+            except retry_on as e:
+                result, failed, error = None, True, e
+            if not failed:
+                return result
+
+            delay = self.backoff(retry, _retry_after(result))
+            if retry == self.max_retries or time.monotonic() + delay >= deadline:
+                return self._give_up(result, error)
+            if result is not None and discard is not None:
+                await discard(result)
+            self.count('retries')
+            await asyncio.sleep(delay)
+        self.count('deadline_exceeded')
+        raise UpstreamDeadlineExceeded(f"{self.name}: no response within {self.timeout}s")
+
+    async def _atimed(self, attempt, timeout):
+        self.count('attempts')
+        start = time.monotonic()
+        result = await attempt(timeout)
+        self.histogram.record(time.monotonic() - start)
+        return result
+
+    async def _ahedged(self, attempt, timeout, is_failure, retry_on, discard):
+        hedge_delay = self._may_hedge(timeout)
+        if hedge_delay is None:
+            return await self._atimed(attempt, timeout)
+
+        deadline = time.monotonic() + timeout
+        primary = asyncio.ensure_future(self._atimed(attempt, timeout))
+        done, _ = await asyncio.wait({primary}, timeout=hedge_delay)
+        # A busy event loop can wake this up late; the hedge only gets what is left of the deadline
+        remaining = deadline - time.monotonic()
+        if done or remaining <= 0 or not self._take_hedge():
+            return await primary
+        hedge = asyncio.ensure_future(self._atimed(attempt, remaining))
+
+        pending = {primary, hedge}
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                error = task.exception()
+                if error is not None and not isinstance(error, retry_on):
+                    for other in pending:
+                        other.cancel()
+                    raise error
+                if error is None and not (is_failure is not None and is_failure(task.result())):
+                    if task is hedge:
+                        self.count('hedge_wins')
+                    # Unlike threads, the slower attempt can simply be cancelled
+                    for other in pending:
+                        other.cancel()
+                    return task.result()
+                if pending and error is None and discard is not None:
+                    await discard(task.result())
+        return task.result()
+
+
+def _retry_after(response):
+    if not isinstance(response, httpx.Response):
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+_policies = {}
+_policies_lock = threading.Lock()
+
+
+def get_upstream_policy(name):
+    """The process-wide policy (and latency histogram) of an upstream, created from the environment."""
+    with _policies_lock:
+        if name not in _policies:
+            _policies[name] = UpstreamPolicy.from_env(name)
+        return _policies[name]
+
+
+def upstream_report():
+    """Per-upstream latency percentiles and counters, e.g. for GET /admin/upstream."""
+    with _policies_lock:
+        policies = dict(_policies)
+    return {name: policy.report() for name, policy in policies.items()}
+
+
+_pools = {}
+
+
+def _pool(kind, max_workers):
+    # Threads do not survive fork, so every (gunicorn worker) process gets its own pools
+    pid = os.getpid()
+    if _pools.get('pid') != pid:
+        _pools.clear()
+        _pools['pid'] = pid
+    if kind not in _pools:
+        _pools[kind] = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"upstream-{kind}")
+    return _pools[kind]
+
+
+def _attempt_pool():
+    # First attempts of calls that may be hedged; sized like the connection pool they wait on anyway
+    return _pool('attempt', int(os.getenv("UPSTREAM_MAX_CONNECTIONS", "64")))
+
+
+def _hedge_pool():
+    # Hedges only, at most hedge_budget of calls; kept apart so they never delay first attempts
+    return _pool('hedge', 32)
+
+
+def connection_limits():
+    max_connections = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", "64"))
+    return httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_connections // 2,
+        keepalive_expiry=float(os.getenv("UPSTREAM_KEEPALIVE_SECONDS", "60")),
+    )
+
+
+def _with_timeout(request, timeout):
+    # A fresh request per attempt: hedged attempts run concurrently and must not share extensions
+    return httpx.Request(
+        request.method, request.url, headers=request.headers, content=request.content,
+        extensions={**request.extensions, 'timeout': dict.fromkeys(('connect', 'read', 'write', 'pool'), timeout)}
+    )
+
+
+def _is_streaming(request):
+    try:
+        return bool(json.loads(request.content).get('stream'))
+    except (ValueError, AttributeError):
+        return False
+
+
+def _is_retryable_response(response):
+    return response.status_code in RETRYABLE_STATUS
+
+
+class UpstreamTransport(httpx.BaseTransport):
+    """
+    httpx transport that sends every request under an UpstreamPolicy over a persistent
+    connection pool.
+
+    Response bodies are read inside the attempt, so latencies cover the full response and
+    a hedged duplicate can be discarded cleanly. Streaming requests are retried but not
+    hedged, and their bodies are left to the caller.
+    """
+
+    def __init__(self, policy, limits=None):
+        self.policy = policy
+        self.limits = limits or connection_limits()
+        self._pid = None
+        self._transport = None
+
+    @property
+    def transport(self):
+        # Pooled connections must not be shared with forked worker processes
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._transport = httpx.HTTPTransport(limits=self.limits, retries=0)
+        return self._transport
+
+    def handle_request(self, request):
+        request.read()
+        streaming = _is_streaming(request)
+
+        def attempt(timeout):
+            response = self.transport.handle_request(_with_timeout(request, timeout))
+            if streaming:
+                return response
+            try:
+                content = b"".join(response.stream)
+            finally:
+                response.close()
+            return httpx.Response(response.status_code, headers=response.headers, content=content,
+                                  extensions=response.extensions)
+
+        return self.policy.call(attempt, is_failure=_is_retryable_response, retry_on=(httpx.TransportError,),
+                                discard=httpx.Response.close, hedge=not streaming)
+
+    def close(self):
+        if self._transport is not None:
+            self._transport.close()
+
+
+class AsyncUpstreamTransport(httpx.AsyncBaseTransport):
+    """Async counterpart of UpstreamTransport, used by the async OpenAI clients."""
+
+    def __init__(self, policy, limits=None):
+        self.policy = policy
+        self.limits = limits or connection_limits()
+        self._pid = None
+        self._transport = None
+
+    @property
+    def transport(self):
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._transport = httpx.AsyncHTTPTransport(limits=self.limits, retries=0)
+        return self._transport
+
+    async def handle_async_request(self, request):
+        await request.aread()
+        streaming = _is_streaming(request)
+
+        async def attempt(timeout):
+            response = await self.transport.handle_async_request(_with_timeout(request, timeout))
+            if streaming:
+                return response
+            try:
+                content = b"".join([chunk async for chunk in response.stream])
+            finally:
+                await response.aclose()
+            return httpx.Response(response.status_code, headers=response.headers, content=content,
+                                  extensions=response.extensions)
+
+        return await self.policy.acall(attempt, is_failure=_is_retryable_response,
+                                       retry_on=(httpx.TransportError,), discard=httpx.Response.aclose,
+                                       hedge=not streaming)
+
+    async def aclose(self):
+        if self._transport is not None:
+            await self._transport.aclose()
+
+
+_http_clients = {}
+
+
+def openai_client_kwargs(name):
+    """
+    Keyword arguments that route a llama-index OpenAI LLM or embedding model through the
+    shared, pooled client of upstream `name`.
+
+    The OpenAI SDK's own retries are turned off; the upstream policy retries instead, within
+    its deadline.
+    """
+    policy = get_upstream_policy(name)
+    with _policies_lock:
+        if name not in _http_clients:
+            _http_clients[name] = (
+                httpx.Client(transport=UpstreamTransport(policy), timeout=policy.timeout),
+                httpx.AsyncClient(transport=AsyncUpstreamTransport(policy), timeout=policy.timeout),
+            )
+        http_client, async_http_client = _http_clients[name]
+    return {
+        'max_retries': 0,
+        'timeout': policy.timeout,
+        'http_client': http_client,
+        'async_http_client': async_http_client,
+    }
+
+
+class UpstreamOpenAIEmbedding(OpenAIEmbedding):
+    """
+    OpenAIEmbedding without llama-index's fixed retry loop (up to 6 attempts with waits of up
+    to 20 s), which would otherwise run on top of the upstream policy and ignore its deadline.
+    """
+
+    def _get_query_embedding(self, query):
+        return get_embedding.__wrapped__(self._get_client(), query, engine=self._query_engine,
+                                         **self.additional_kwargs)
+
+    async def _aget_query_embedding(self, query):
+        return await aget_embedding.__wrapped__(self._get_aclient(), query, engine=self._query_engine,
+                                                **self.additional_kwargs)
+
+    def _get_text_embedding(self, text):
+        return get_embedding.__wrapped__(self._get_client(), text, engine=self._text_engine,
+                                         **self.additional_kwargs)
+
+    async def _aget_text_embedding(self, text):
+        return await aget_embedding.__wrapped__(self._get_aclient(), text, engine=self._text_engine,
+                                                **self.additional_kwargs)
+
+    def _get_text_embeddings(self, texts):
+        return get_embeddings.__wrapped__(self._get_client(), texts, engine=self._text_engine,
+                                          **self.additional_kwargs)
+
+    async def _aget_text_embeddings(self, texts):
+        return await aget_embeddings.__wrapped__(self._get_aclient(), texts, engine=self._text_engine,
+                                                 **self.additional_kwargs)
+
+
+class PooledNeo4jGraphStore(Neo4jGraphStore):
+    """
+    Neo4jGraphStore over a tuned, persistent driver, with every query run under the
+    'neo4j' upstream policy (per-query deadline, jittered retries of transient errors).
+
+    The base class creates a driver with default settings and closes it again right after
+    checking connectivity, so every later query reopens connections; that driver is replaced
+    by one that keeps its connections and leaves retries to the policy.
+    """
+
+    def __init__(self, username, password, url, database="neo4j", policy=None, **kwargs):
+        self._policy = policy or get_upstream_policy('neo4j')
+        super().__init__(username, password, url, database=database, **kwargs)
+        self._driver.close()
+        self._driver = neo4j.GraphDatabase.driver(
+            url,
+            auth=(username, password),
+            max_connection_pool_size=int(os.getenv("NEO4J_MAX_CONNECTIONS", "50")),
+            connection_acquisition_timeout=self._policy.timeout,
+            connection_timeout=min(5.0, self._policy.timeout),
+            # execute_query otherwise retries transient errors itself for up to 30s, past the
+            # policy's deadline; the policy is the only retry layer
+            max_transaction_retry_time=0,
+            max_connection_lifetime=3600,
+            liveness_check_timeout=30,
+            keep_alive=True,
+        )
+
+    def query(self, query, param_map=None):
+        param_map = param_map or {}
+
+        def attempt(timeout):
+            # The transaction timeout is enforced by the server
+            records, _, _ = self._driver.execute_query(
+                neo4j.Query(query, timeout=timeout), database_=self._database, parameters_=param_map)
+            return [record.data() for record in records]
+
+        try:
+            return self._policy.call(attempt, retry_on=NEO4J_RETRYABLE_ERRORS)
+        except neo4j.exceptions.Neo4jError as e:
+            if e.code in ("Neo.DatabaseError.Statement.ExecutionFailed",
+                          "Neo.DatabaseError.Transaction.TransactionStartFailed",
+                          "Neo.ClientError.Statement.SemanticError"):
+                # Queries that must run in an implicit transaction; the base class handles those
+                return super().query(query, param_map)
+            raise
+
+    def close(self):
+        self._driver.close()
+
+
+def get_neo4j_graph_store():
+    """
+    Graph store for the knowledge graph, configured from NEO4J_URL, NEO4J_USERNAME,
+    NEO4J_PASSWORD and NEO4J_DATABASE (defaulting to the local development database).
+
+    Returns:
+    PooledNeo4jGraphStore: The connected graph store.
+    """
+    return PooledNeo4jGraphStore(
+        username=os.getenv("NEO4J_USERNAME", "neo4j"),
+        password=os.getenv("NEO4J_PASSWORD", "Ss123456$"),
+        url=os.getenv("NEO4J_URL", "bolt://localhost:7687"),
+        database=os.getenv("NEO4J_DATABASE", "neo4j"),
+    )
@@ -1,6 +1,7 @@
 import pandas as pd
 from dotenv import load_dotenv
 import os
+import time
 
 # Function to load and validate configuration settings
 def load_config():
@@ -22,10 +23,14 @@ def remove_nul_chars_from_run_data(run_data):
         run.llm_context = [remove_nul_chars_from_string(context) for context in run.llm_context]
 
 
-def make_get_llama_response(query_engine):
+def make_get_llama_response(query_engine, latencies=None):
+    """Tonic Validate callback for a query engine; records seconds per question in `latencies` if given."""
     def get_llama_response(prompt):
         # print(prompt)
+        start = time.perf_counter()
         response = query_engine.query(prompt)
+        if latencies is not None:
+            latencies[prompt] = time.perf_counter() - start
         context = []
         for x in response.source_nodes:
             # Initialize context string with the text of the node
@@ -42,7 +47,7 @@ def make_get_llama_response(query_engine):
 
 
 def run_experiment(experiment_name, query_engine, scorer, benchmark,
-                   validate_api, project_key, upload_results=True, runs=5):
+                   validate_api, project_key, upload_results=True, runs=5, results_store=None):
 
     load_config()
 
@@ -50,7 +55,8 @@ def run_experiment(experiment_name, query_engine, scorer, benchmark,
     results_list = []
 
     for i in range(runs):
-        get_llama_response_func = make_get_llama_response(query_engine)
+        latencies = {}
+        get_llama_response_func = make_get_llama_response(query_engine, latencies)
         run = scorer.score(benchmark,
                            get_llama_response_func,
                            callback_parallelism=1,
@@ -61,6 +67,10 @@ def run_experiment(experiment_name, query_engine, scorer, benchmark,
         # Add this run's results to the list
         results_list.append({'Run': i+1, 'Experiment': experiment_name, 'OverallScores': run.overall_scores})
 
+        # Append per-question scores and latencies as soon as the run is scored (see results_store.py)
+        if results_store is not None:
+            results_store.append_run(experiment_name, run, run_number=i+1, latencies=latencies)
+
         if upload_results:
           project_key = os.getenv("TONIC_VALIDATE_PROJECT_KEY")
           validate_api.upload_run(project_key, run=run, run_metadata={"approach": experiment_name, "run_number": i+1})